@@ -0,0 +1,149 @@
+import asyncio
+import math
+import os
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+
+class AdmissionLimiter:
+    """Weighted concurrency limit with a bounded FIFO queue and per-user in-flight caps"""
+
+    def __init__(self, name: str, capacity: int, max_queue: int, per_user: int = 0,
+                 queue_timeout: float = 30.0, retry_after: int = 5):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_queue = max(0, max_queue)
+        self.per_user = max(0, per_user)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._in_use = 0
+        self._waiters = deque()
+        self._user_inflight: Dict[str, int] = defaultdict(int)
+        self._admitted = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls, name: str, capacity: int, max_queue: int, per_user: int = 0):
+        """Build a limiter whose defaults can be overridden by <NAME>_MAX_CONCURRENT etc."""
+        prefix = name.upper()
+        return cls(
+            name=name,
+            capacity=int(os.getenv(f"{prefix}_MAX_CONCURRENT", capacity)),
+            max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", max_queue)),
+            per_user=int(os.getenv(f"{prefix}_MAX_PER_USER", per_user)),
+            queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", 30.0)),
+            retry_after=int(os.getenv(f"{prefix}_RETRY_AFTER", 5)),
+        )
+
+    def _reject(self, detail: str):
+        self._rejected += 1
+        raise HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def _wake(self):
+        while self._waiters:
+            weight, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self._in_use + weight > self.capacity:
+                break
+            self._waiters.popleft()
+            self._in_use += weight
+            future.set_result(None)
+
+    def _release(self, weight: int):
+        self._in_use -= weight
+        self._wake()
+
+    async def _acquire(self, weight: int):
+        if not self._waiters and self._in_use + weight <= self.capacity:
+            self._in_use += weight
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject(f"Server busy: too many pending {self.name} requests, please retry later")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (weight, future)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been granted in the same loop iteration the timeout fired
+            if future.done() and not future.cancelled():
+                self._release(weight)
+            else:
+                self._dequeue(entry)
+            self._reject(f"Server busy: timed out waiting for a {self.name} slot, please retry later")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(weight)
+            else:
+                self._dequeue(entry)
+            raise
+
+    def _dequeue(self, entry):
+        # A departing head of the queue may have been holding back smaller waiters that fit
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, user: Optional[str] = None, weight: int = 1):
+        """Hold one admission slot of the given weight for the duration of the block"""
+        weight = max(1, min(int(weight), self.capacity))
+
+        if user is not None and self.per_user and self._user_inflight[user] >= self.per_user:
+            self._reject(f"Too many concurrent {self.name} requests for this user")
+
+        if user is not None:
+            self._user_inflight[user] += 1
+        try:
+            await self._acquire(weight)
+            self._admitted += 1
+            try:
+                yield
+            finally:
+                self._release(weight)
+        finally:
+            if user is not None:
+                self._user_inflight[user] -= 1
+                if self._user_inflight[user] <= 0:
+                    del self._user_inflight[user]
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self._in_use,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_per_user": self.per_user,
+            "users_in_flight": len(self._user_inflight),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+        }
+
+
+def trends_weight(days: int) -> int:
+    """Weight a trends request by the number of 30-day windows it scans"""
+    return max(1, math.ceil(days / 30))
+
+
+# Route limiters (override with e.g. EXPORT_MAX_CONCURRENT=4 in the environment)
+export_limiter = AdmissionLimiter.from_env("export", capacity=2, max_queue=4, per_user=1)
+trends_limiter = AdmissionLimiter.from_env("trends", capacity=12, max_queue=24, per_user=2)
+login_limiter = AdmissionLimiter.from_env("login", capacity=8, max_queue=32, per_user=2)
+
+LIMITERS = {limiter.name: limiter for limiter in (export_limiter, trends_limiter, login_limiter)}
+
+
+def admission_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
@@ -0,0 +1,129 @@
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Line item kinds
+PRODUCTION = "production"
+SALES = "sales"
+STOCK = "stock"
+KINDS = [PRODUCTION, SALES, STOCK]
+
+LOG_COLUMNS = ["id", "report_id", "factory_id", "date", "downtime_hours", "created_by", "created_at"]
+TOTAL_COLUMNS = ["production", "sales", "revenue", "stock"]
+ITEM_COLUMNS = ["log", "factory_id", "date", "day", "product", "kind", "qty", "unit_price", "revenue"]
+
+
+def _numeric(values) -> np.ndarray:
+    array = np.asarray(values)
+    if array.dtype.kind in "iuf":
+        return array
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).to_numpy()
+
+
+def _sum_by_log(positions: np.ndarray, values: np.ndarray, count: int) -> np.ndarray:
+    totals = np.bincount(positions, weights=values, minlength=count)
+    return totals.astype(values.dtype) if values.dtype.kind in "iu" else totals
+
+
+def build_frames(logs: List[dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Flatten daily log documents into a per-log frame and a long per-line-item frame
+
+    The log frame has one row per document (in input order) with its scalar fields and
+    production/sales/revenue/stock totals. The item frame has one row per
+    (log, product, kind) with quantity, unit price and revenue.
+    """
+    count = len(logs)
+    log_frame = pd.DataFrame({
+        "id": [log.get("id") for log in logs],
+        "report_id": [log.get("report_id", "N/A") for log in logs],
+        "factory_id": [log.get("factory_id") for log in logs],
+        "date": pd.to_datetime([log.get("date") for log in logs]),
+        "downtime_hours": _numeric([log.get("downtime_hours", 0) for log in logs]),
+        "created_by": [log.get("created_by", "Unknown") for log in logs],
+        "created_at": pd.to_datetime([log.get("created_at") for log in logs]),
+    }, columns=LOG_COLUMNS)
+
+    # Single pass over the nested dicts, extending flat columns per kind;
+    # everything after this is columnar
+    products = {kind: [] for kind in KINDS}
+    quantities = {kind: [] for kind in KINDS}
+    lengths = {kind: [] for kind in KINDS}
+    unit_prices = []
+    for log in logs:
+        for kind, field in ((PRODUCTION, "production_data"), (STOCK, "stock_data")):
+            values = log.get(field) or {}
+            products[kind].extend(values)
+            quantities[kind].extend(values.values())
+            lengths[kind].append(len(values))
+        sales = [(product, sale) for product, sale in (log.get("sales_data") or {}).items() if isinstance(sale, dict)]
+        products[SALES].extend(product for product, _ in sales)
+        quantities[SALES].extend(sale.get("amount", 0) for _, sale in sales)
+        unit_prices.extend(sale.get("unit_price", 0) for _, sale in sales)
+        lengths[SALES].append(len(sales))
+
+    log_index = np.arange(count)
+    positions = {kind: np.repeat(log_index, lengths[kind]) if count else log_index for kind in KINDS}
+    qty = {kind: _numeric(quantities[kind]) for kind in KINDS}
+    prices = {
+        PRODUCTION: np.zeros(len(qty[PRODUCTION])),
+        SALES: _numeric(unit_prices).astype(float),
+        STOCK: np.zeros(len(qty[STOCK])),
+    }
+    revenue = qty[SALES] * prices[SALES]
+
+    # Per-log totals straight from the flat columns
+    log_frame["production"] = _sum_by_log(positions[PRODUCTION], qty[PRODUCTION], count)
+    log_frame["sales"] = _sum_by_log(positions[SALES], qty[SALES], count)
+    log_frame["revenue"] = np.bincount(positions[SALES], weights=revenue, minlength=count)
+    log_frame["stock"] = _sum_by_log(positions[STOCK], qty[STOCK], count)
+
+    all_positions = np.concatenate([positions[kind] for kind in KINDS]).astype(np.int64)
+    log_days = log_frame["date"].dt.strftime("%Y-%m-%d").to_numpy()
+    item_frame = pd.DataFrame({
+        "log": all_positions,
+        "factory_id": log_frame["factory_id"].to_numpy()[all_positions],
+        "date": log_frame["date"].to_numpy()[all_positions],
+        "day": log_days[all_positions],
+        "product": products[PRODUCTION] + products[SALES] + products[STOCK],
+        "kind": np.repeat(KINDS, [len(products[kind]) for kind in KINDS]),
+        "qty": np.concatenate([qty[kind] for kind in KINDS]),
+        "unit_price": np.concatenate([prices[kind] for kind in KINDS]),
+        "revenue": np.concatenate([np.zeros(len(qty[PRODUCTION])), revenue, np.zeros(len(qty[STOCK]))]),
+    }, columns=ITEM_COLUMNS)
+
+    return log_frame, item_frame
+
+
+def factory_totals(log_frame: pd.DataFrame) -> pd.DataFrame:
+    """Per-factory production, sales, revenue, downtime, stock and report counts"""
+    grouped = log_frame.groupby("factory_id", sort=False, dropna=False)
+    totals = grouped[TOTAL_COLUMNS + ["downtime_hours"]].sum()
+    totals = totals.rename(columns={"downtime_hours": "downtime"})
+    totals["reports"] = grouped.size()
+    return totals
+
+
+def daily_product_series(item_frame: pd.DataFrame, factory_id: str, kind: str,
+                         products: Iterable[str], days: List[str]) -> pd.DataFrame:
+    """Day x product matrix of summed quantities for one factory, zero-filled over `days`"""
+    products = list(products)
+    mask = (
+        (item_frame["factory_id"] == factory_id)
+        & (item_frame["kind"] == kind)
+        & item_frame["product"].isin(products)
+    )
+    selected = item_frame[mask]
+    matrix = selected.groupby(["day", "product"])["qty"].sum().unstack("product", fill_value=0)
+    matrix = matrix.reindex(index=days, columns=products, fill_value=0).fillna(0)
+    # Reindexing an empty or partial matrix goes through float; integer quantities stay integers
+    if selected.empty or selected["qty"].dtype.kind in "iu":
+        return matrix.astype(np.int64)
+    return matrix
+
+
+def to_native(values) -> list:
+    """Convert a numpy/pandas sequence into JSON-friendly Python scalars"""
+    return np.asarray(values).tolist()
+
@@ -0,0 +1,181 @@
+"""Anomaly detection over daily production, sales and downtime series.
+
+Every factory contributes one series per configured product and kind (production and
+sales), a total per kind and a downtime series. Each day is compared with a robust
+baseline over the trailing window of days before it, skipping days without a report:
+the rolling median and the median absolute deviation (MAD). A day is flagged when its robust z-score exceeds
+the threshold. All series are stacked into one day x series matrix, so the rolling
+statistics are a handful of NumPy calls no matter how many factories or products there are.
+
+The matrix is built from per-(factory, month) blocks. Closed months are cached under
+the same data-version signature as the export fragments, so a request only reloads the
+current month and months that were edited since the last run.
+"""
+import warnings
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from analytics import PRODUCTION, SALES
+
+DOWNTIME = "downtime"
+TOTAL = "*"  # product label of the per-factory total series; reported as null
+MIN_SCALE = 1.0  # floor on the baseline spread, in the series' own units
+BASELINE_CHUNK_ELEMENTS = 4_000_000  # values per rolling-baseline chunk (32 MB of float64)
+
+SeriesKey = Tuple[str, str, str]  # (factory_id, metric, product or TOTAL)
+
+
+def daily_downtime_pipeline(query: dict) -> List[dict]:
+    """Per (factory, day) downtime sums; every returned day had at least one report"""
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": {
+                "factory_id": "$factory_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+            },
+            "downtime": {"$sum": "$downtime_hours"},
+        }},
+        {"$project": {"_id": 0, "factory_id": "$_id.factory_id", "day": "$_id.day", "downtime": 1}},
+    ]
+
+
+def series_keys(factory_id: str, products: List[str]) -> List[SeriesKey]:
+    keys = []
+    for kind in (PRODUCTION, SALES):
+        keys.extend((factory_id, kind, product) for product in products)
+        keys.append((factory_id, kind, TOTAL))
+    keys.append((factory_id, DOWNTIME, TOTAL))
+    return keys
+
+
+def month_days(month: str) -> List[str]:
+    start = datetime.strptime(month, "%Y-%m")
+    days = []
+    while start.strftime("%Y-%m") == month:
+        days.append(start.strftime("%Y-%m-%d"))
+        start += timedelta(days=1)
+    return days
+
+
+def build_blocks(item_frame: pd.DataFrame, day_rows: List[dict], months: List[Tuple[str, str]],
+                 products: Dict[str, List[str]]) -> Dict[Tuple[str, str], pd.DataFrame]:
+    """Day x series frames for (factory, month) pairs; days without a report are NaN"""
+    items = item_frame[item_frame["kind"].isin([PRODUCTION, SALES])]
+    reports = pd.DataFrame(day_rows, columns=["factory_id", "day", "downtime"])
+
+    months_by_factory: Dict[str, List[str]] = {}
+    for factory_id, month in months:
+        months_by_factory.setdefault(factory_id, []).append(month)
+
+    blocks = {}
+    for factory_id, factory_months in months_by_factory.items():
+        keys = series_keys(factory_id, products.get(factory_id, []))
+        days = [day for month in sorted(factory_months) for day in month_days(month)]
+        factory_items = items[items["factory_id"] == factory_id]
+        factory_reports = reports[reports["factory_id"] == factory_id]
+
+        # Long (day, metric, product, value) rows, pivoted once into the factory's series
+        long = pd.concat([
+            factory_items.rename(columns={"kind": "metric", "qty": "value"}),
+            factory_items.groupby(["day", "kind"], as_index=False)["qty"].sum()
+            .rename(columns={"kind": "metric", "qty": "value"}).assign(product=TOTAL),
+            factory_reports.rename(columns={"downtime": "value"}).assign(metric=DOWNTIME, product=TOTAL),
+        ])[["day", "metric", "product", "value"]]
+        wide = long.pivot_table(index="day", columns=["metric", "product"], values="value", aggfunc="sum")
+        wide = wide.reindex(
+            index=days, columns=pd.MultiIndex.from_tuples([key[1:] for key in keys]), fill_value=0
+        ).fillna(0)
+        wide[~wide.index.isin(factory_reports["day"])] = np.nan
+        wide.columns = pd.MultiIndex.from_tuples(keys)
+
+        for month in factory_months:
+            blocks[(factory_id, month)] = wide[wide.index.str.startswith(month)]
+    return blocks
+
+
+def rolling_baseline(values: np.ndarray, window: int,
+                     max_elements: int = BASELINE_CHUNK_ELEMENTS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Median, robust spread and observation count of the `window` days before each day
+
+    Series are processed in chunks of at most max_elements day x series x window values,
+    which bounds the temporary copies nanmedian makes.
+    """
+    days, series = values.shape
+    step = max(1, max_elements // max(1, days * window))
+    chunks = [_rolling_baseline(values[:, start:start + step], window) for start in range(0, series, step)]
+    if not chunks:
+        return _rolling_baseline(values, window)
+    return tuple(np.concatenate(parts, axis=1) for parts in zip(*chunks))
+
+
+def _rolling_baseline(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    days, series = values.shape
+    padded = np.vstack([np.full((window, series), np.nan), values[:-1]]) if days else values
+    windows = sliding_window_view(padded, window, axis=0)  # days x series x window, no copy
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN windows
+        median = np.nanmedian(windows, axis=-1)
+        deviations = np.abs(windows - median[..., None])
+        mad = np.nanmedian(deviations, axis=-1)
+        mean_deviation = np.nanmean(deviations, axis=-1)
+    observed = np.count_nonzero(~np.isnan(windows), axis=-1)
+    # 1.4826 * MAD estimates the standard deviation for normal data; fall back to the
+    # mean absolute deviation when more than half of the window sits on the median
+    scale = np.where(mad > 0, 1.4826 * mad, 1.2533 * mean_deviation)
+    return median, np.fmax(np.nan_to_num(scale), MIN_SCALE), observed
+
+
+def detect_anomalies(matrix: pd.DataFrame, window: int, threshold: float, start_day: str,
+                     min_periods: Optional[int] = None) -> List[dict]:
+    """Flag days on or after start_day whose robust z-score exceeds threshold"""
+    min_periods = min_periods or max(3, window // 2)
+    values = matrix.to_numpy(dtype=float)
+    median, scale, observed = rolling_baseline(values, window)
+    with np.errstate(invalid="ignore"):
+        score = (values - median) / scale
+    flagged = (
+        (np.abs(score) > threshold)
+        & (observed >= min_periods)
+        & ~np.isnan(values)
+        & (matrix.index.to_numpy() >= start_day)[:, None]
+    )
+
+    anomalies = []
+    days = matrix.index.to_numpy()
+    for row, column in zip(*np.nonzero(flagged)):
+        factory_id, metric, product = matrix.columns[column]
+        anomalies.append({
+            "date": str(days[row]),
+            "factory_id": factory_id,
+            "metric": metric,
+            "product": None if product == TOTAL else product,
+            "value": float(values[row, column]),
+            "baseline": float(median[row, column]),
+            "score": round(float(score[row, column]), 2),
+            "direction": "high" if score[row, column] > 0 else "low",
+        })
+    anomalies.sort(key=lambda anomaly: (anomaly["date"], abs(anomaly["score"])), reverse=True)
+    return anomalies
+
+
+def assemble_matrix(blocks: Dict[Tuple[str, str], pd.DataFrame], factory_ids: List[str],
+                    products: Dict[str, List[str]], days: List[str]) -> pd.DataFrame:
+    """Stack cached month blocks into one day x series matrix over `days`"""
+    columns = []
+    frames = []
+    for factory_id in factory_ids:
+        keys = series_keys(factory_id, products.get(factory_id, []))
+        columns.extend(keys)
+        months = sorted(month for factory, month in blocks if factory == factory_id)
+        if months:
+            frames.append(pd.concat([blocks[(factory_id, month)] for month in months]))
+    index = pd.Index(days)
+    if not frames:
+        return pd.DataFrame(np.nan, index=index, columns=pd.MultiIndex.from_tuples(columns))
+    matrix = pd.concat(frames, axis=1)
+    return matrix.reindex(index=index, columns=pd.MultiIndex.from_tuples(columns))
@@ -0,0 +1,239 @@
+"""Time-partitioned archival of old daily logs.
+
+Logs dated before the archive horizon are moved out of the hot daily_logs collection
+into per-year collections (daily_logs_2023, daily_logs_2024, ...). Per (factory, month)
+rollups of their totals are kept in the hot database (daily_log_rollups), so
+all-time summaries never have to open an archive. Reads go through
+archive_catalog.collections_for(), which routes a date range only to the partitions it
+overlaps. Archived logs are read-only.
+
+A run publishes the new routing state first and waits ARCHIVE_STATE_TTL_SECONDS, so
+every server process routes to the new partitions (and refuses edits to logs before
+the horizon) before the first log moves. Logs are copied, then deleted, so a read can
+briefly see one in both places; find_daily_logs() keeps the first copy. The run ends by
+resetting the data-version epoch, which drops exports and fragments rendered meanwhile.
+
+Usage (from the backend directory):
+    python archive.py run                    # archive logs older than ARCHIVE_HORIZON_DAYS
+    python archive.py run --horizon-days 730
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from data_versions import EPOCH_ID, VERSIONS_COLLECTION
+from line_items import expand_line_items
+from log_totals import TOTAL_FIELDS, totals_for
+
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", 365))
+ARCHIVE_STATE_TTL_SECONDS = float(os.getenv("ARCHIVE_STATE_TTL_SECONDS", 60))
+ARCHIVE_PREFIX = "daily_logs_"
+ROLLUP_COLLECTION = "daily_log_rollups"
+STATE_COLLECTION = "archive_state"
+STATE_ID = "daily_logs"
+
+
+def archive_collection_name(year: int) -> str:
+    return f"{ARCHIVE_PREFIX}{year}"
+
+
+class ArchiveCatalog:
+    """Cached view of which years have been archived, used to route reads"""
+
+    def __init__(self, ttl_seconds: float = ARCHIVE_STATE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._state: Optional[dict] = None
+        self._loaded_at = 0.0
+
+    async def state(self, db) -> dict:
+        if self._state is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self._state = await db[STATE_COLLECTION].find_one({"_id": STATE_ID}) or {}
+            self._loaded_at = time.monotonic()
+        return self._state
+
+    def invalidate(self):
+        self._state = None
+
+    async def archived_years(self, db, query: dict) -> List[int]:
+        """Archived years overlapping the date range in query"""
+        state = await self.state(db)
+        years = sorted(state.get("years", []))
+        date_filter = query.get("date") or {}
+        start, end = date_filter.get("$gte"), date_filter.get("$lte", date_filter.get("$lt"))
+
+        archived_before = state.get("archived_before")
+        if start is not None and archived_before is not None and start >= archived_before:
+            return []
+        return [
+            year for year in years
+            if (start is None or year >= start.year) and (end is None or year <= end.year)
+        ]
+
+    async def collections_for(self, db, query: dict) -> list:
+        """Hot collection plus every archive partition the query can touch"""
+        years = await self.archived_years(db, query)
+        return [db.daily_logs] + [db[archive_collection_name(year)] for year in years]
+
+    async def max_report_number(self, db) -> int:
+        return (await self.state(db)).get("max_report_number", 0)
+
+    async def is_read_only(self, db, log: dict) -> bool:
+        """Whether log is dated before the horizon, i.e. archived or about to be"""
+        archived_before = (await self.state(db)).get("archived_before")
+        return archived_before is not None and log["date"] < archived_before
+
+
+archive_catalog = ArchiveCatalog()
+
+
+def rollup_totals_pipeline(query: dict) -> List[dict]:
+    """Per-factory sums over archived (factory, month) rollups"""
+    match = {"factory_id": query["factory_id"]} if "factory_id" in query else {}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$factory_id",
+            "production": {"$sum": "$production"},
+            "sales": {"$sum": "$sales"},
+            "revenue": {"$sum": "$revenue"},
+            "stock": {"$sum": "$stock"},
+            "downtime": {"$sum": "$downtime"},
+            "reports": {"$sum": "$reports"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "factory_id": "$_id",
+            "production": 1,
+            "sales": 1,
+            "revenue": 1,
+            "stock": 1,
+            "downtime": 1,
+            "reports": 1,
+        }},
+    ]
+
+
+def _month_start(date: datetime) -> datetime:
+    return datetime(date.year, date.month, 1)
+
+
+def _next_month_start(date: datetime) -> datetime:
+    return datetime(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+
+def _rebuild_rollups(db, year: int, start: datetime, end: datetime):
+    """Recompute the (factory, month) rollups of the months from start to end from one partition"""
+    from pymongo import ReplaceOne
+
+    pipeline = [
+        {"$match": {"date": {"$gte": _month_start(start), "$lt": _next_month_start(end)}}},
+        {"$group": {
+            "_id": {"factory_id": "$factory_id", "month": {"$dateToString": {"format": "%Y-%m", "date": "$date"}}},
+            "production": {"$sum": "$total_production"},
+            "sales": {"$sum": "$total_sales"},
+            "revenue": {"$sum": "$total_revenue"},
+            "stock": {"$sum": "$total_stock"},
+            "downtime": {"$sum": "$downtime_hours"},
+            "reports": {"$sum": 1},
+        }},
+    ]
+    operations = []
+    for row in db[archive_collection_name(year)].aggregate(pipeline):
+        key = row.pop("_id")
+        rollup = {**key, "year": year, **row}
+        operations.append(ReplaceOne(key, rollup, upsert=True))
+    if operations:
+        db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def _report_number(report_id: Optional[str]) -> int:
+    if report_id and report_id.startswith("RPT-") and report_id[4:].isdigit():
+        return int(report_id[4:])
+    return 0
+
+
+def run_archive(db, horizon_days: int, batch_size: int = 500, routing_delay: float = ARCHIVE_STATE_TTL_SECONDS) -> int:
+    """Move logs older than the horizon into per-year partitions; idempotent if interrupted"""
+    from pymongo import DeleteMany, ReplaceOne
+
+    cutoff = datetime.combine((datetime.utcnow() - timedelta(days=horizon_days)).date(), datetime.min.time())
+    state = db[STATE_COLLECTION].find_one({"_id": STATE_ID}) or {}
+    years = set(state.get("years", []))
+    max_report = state.get("max_report_number", 0)
+    old_logs = {"date": {"$lt": cutoff}}
+
+    # Publish the routing for everything this run will move before moving any of it
+    for log in db.daily_logs.find(old_logs, {"date": 1, "report_id": 1}):
+        years.add(log["date"].year)
+        max_report = max(max_report, _report_number(log.get("report_id")))
+    for year in years:
+        partition = db[archive_collection_name(year)]
+        partition.create_index([("factory_id", 1), ("date", 1)])
+        partition.create_index("id")
+    db[ROLLUP_COLLECTION].create_index([("factory_id", 1), ("month", 1)], unique=True)
+    archived_before = max(filter(None, [state.get("archived_before"), cutoff]))
+    db[STATE_COLLECTION].update_one(
+        {"_id": STATE_ID},
+        {"$set": {"archived_before": archived_before, "years": sorted(years), "max_report_number": max_report}},
+        upsert=True,
+    )
+    if routing_delay and db.daily_logs.find_one(old_logs) is not None:
+        # Server processes reload the state at most this long after it changes
+        time.sleep(routing_delay)
+
+    moved = 0
+    pending = {}
+    # In date order, so each batch only touches the rollups of a few months.
+    # Logs of a year not published above were backfilled meanwhile and wait for the next run.
+    for log in db.daily_logs.find(old_logs).sort("date", 1):
+        year = log["date"].year
+        if year not in years:
+            continue
+        if not all(field in log for field in TOTAL_FIELDS):
+            log.update(totals_for(expand_line_items(dict(log))))
+        pending.setdefault(year, []).append(log)
+        if len(pending[year]) >= batch_size:
+            moved += _move_batch(db, year, pending.pop(year), ReplaceOne, DeleteMany)
+    for year, logs in pending.items():
+        moved += _move_batch(db, year, logs, ReplaceOne, DeleteMany)
+
+    if moved:
+        # Exports and fragments rendered while logs were moving may have seen a partial move
+        db[VERSIONS_COLLECTION].update_one({"_id": EPOCH_ID}, {"$set": {"value": uuid.uuid4().hex}}, upsert=True)
+    return moved
+
+
+def _move_batch(db, year: int, logs: List[dict], ReplaceOne, DeleteMany) -> int:
+    # Copy and roll up first, then delete: a crash in between leaves a duplicate that the next run overwrites
+    db[archive_collection_name(year)].bulk_write(
+        [ReplaceOne({"_id": log["_id"]}, log, upsert=True) for log in logs], ordered=False
+    )
+    # Batches are date-ordered, so the first and last logs bound the months they touched
+    _rebuild_rollups(db, year, logs[0]["date"], logs[-1]["date"])
+    db.daily_logs.bulk_write([DeleteMany({"_id": {"$in": [log["_id"] for log in logs]}})])
+    return len(logs)
+
+
+def main(argv: List[str]):
+    from dotenv import load_dotenv
+    from pathlib import Path
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Archive old daily logs into per-year partitions")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    args = parser.parse_args(argv)
+
+    load_dotenv(Path(__file__).parent / ".env")
+    db = MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+    moved = run_archive(db, args.horizon_days)
+    print(f"Archived {moved} logs older than {args.horizon_days} days")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
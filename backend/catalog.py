@@ -0,0 +1,131 @@
+"""Factory and product catalog, stored in MongoDB behind a versioned in-memory cache.
+
+Each factory is one document in factory_catalog (_id is the factory id). Every write
+increments a version counter in catalog_state. factory_catalog.snapshot() serves an
+immutable CatalogSnapshot: the factory dict that /api/factories returns, plus
+precomputed name, unit and product lookups and a content ETag. The snapshot is
+rebuilt only when the stored version changes. Writes in this process invalidate it at
+once; other processes pick the change up within CATALOG_REFRESH_SECONDS.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+CATALOG_COLLECTION = "factory_catalog"
+STATE_COLLECTION = "catalog_state"
+STATE_ID = "factories"
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", 5))
+
+# Seeded into an empty catalog on first startup
+DEFAULT_FACTORIES = {
+    "amen_water": {
+        "name": "Amen (Victory) Water",
+        "products": ["360ml", "600ml", "1000ml", "2000ml"],
+        "sku_unit": "Paket"
+    },
+    "mintu_plast": {
+        "name": "Mintu Plast",
+        "products": [
+            "Preform 27g/28mm", "Preform 28g/28mm", "Preform 42g/28mm",
+            "Preform 24g/28mm", "Preform 20g/28mm", "Preform 39g/30mm",
+            "Preform 17.5g/30mm", "Preform 15g/30mm", "Cap 1.75g/30mm", "Cap 2.6g/28mm"
+        ],
+        "sku_unit": "Pieces"
+    },
+    "mintu_export": {
+        "name": "Mintu Export",
+        "products": ["Sesame", "Niger", "Chickpea", "Red Bean"],
+        "sku_unit": "Quintal"
+    },
+    "wakene_food": {
+        "name": "Wakene Food Complex",
+        "products": ["Flour", "Fruska (Wheat Bran)", "Fruskelo (Wheat Germ)"],
+        "sku_unit": "Quintal"
+    }
+}
+
+
+class CatalogSnapshot:
+    """One catalog version with its lookup tables; never mutated once built"""
+
+    def __init__(self, version: int, factories: Dict[str, dict]):
+        self.version = version
+        self.factories = factories
+        self.names = {factory_id: config["name"] for factory_id, config in factories.items()}
+        self.units = {factory_id: config["sku_unit"] for factory_id, config in factories.items()}
+        self.products = {factory_id: list(config["products"]) for factory_id, config in factories.items()}
+        # Content hash rather than the version, so every process agrees on it
+        content = json.dumps(list(factories.items()), separators=(",", ":"))
+        self.etag = f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"'
+
+
+def catalog_entry(document: dict) -> dict:
+    return {
+        "name": document["name"],
+        "products": list(document["products"]),
+        "sku_unit": document["sku_unit"],
+    }
+
+
+class FactoryCatalog:
+    """Cached catalog snapshot, reloaded only when the stored version moves"""
+
+    def __init__(self, refresh_seconds: float = CATALOG_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.refresh_seconds
+
+    async def snapshot(self, db) -> CatalogSnapshot:
+        if self._fresh():
+            return self._snapshot
+        async with self._lock:
+            if not self._fresh():
+                state = await db[STATE_COLLECTION].find_one({"_id": STATE_ID}) or {}
+                version = state.get("version", 0)
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = await self._load(db, version)
+                self._checked_at = time.monotonic()
+        return self._snapshot
+
+    async def _load(self, db, version: int) -> CatalogSnapshot:
+        documents = await db[CATALOG_COLLECTION].find({}).sort([("order", 1), ("_id", 1)]).to_list(length=None)
+        if not documents and not version:
+            # Not seeded yet: serve the defaults rather than an empty catalog
+            return CatalogSnapshot(version, DEFAULT_FACTORIES)
+        return CatalogSnapshot(version, {document["_id"]: catalog_entry(document) for document in documents})
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+
+async def seed_catalog(db):
+    """Insert DEFAULT_FACTORIES into a catalog that has never been written; idempotent"""
+    if await db[STATE_COLLECTION].find_one({"_id": STATE_ID}) is not None:
+        return
+    for order, (factory_id, config) in enumerate(DEFAULT_FACTORIES.items()):
+        await db[CATALOG_COLLECTION].update_one(
+            {"_id": factory_id}, {"$setOnInsert": {**config, "order": order}}, upsert=True
+        )
+    await db[STATE_COLLECTION].update_one({"_id": STATE_ID}, {"$setOnInsert": {"version": 1}}, upsert=True)
+    factory_catalog.invalidate()
+
+
+async def save_factory(db, factory_id: str, config: dict):
+    """Create or replace one factory and publish a new catalog version"""
+    await seed_catalog(db)
+    order = await db[CATALOG_COLLECTION].count_documents({})
+    await db[CATALOG_COLLECTION].update_one(
+        {"_id": factory_id}, {"$set": config, "$setOnInsert": {"order": order}}, upsert=True
+    )
+    await db[STATE_COLLECTION].update_one({"_id": STATE_ID}, {"$inc": {"version": 1}}, upsert=True)
+    factory_catalog.invalidate()
+
+
+factory_catalog = FactoryCatalog()
@@ -0,0 +1,46 @@
+import uuid
+from datetime import datetime
+from typing import Dict
+
+VERSIONS_COLLECTION = "data_versions"
+EPOCH_ID = "_epoch"
+
+
+def month_key(date: datetime) -> str:
+    return date.strftime("%Y-%m")
+
+
+async def bump_data_version(db, factory_id: str, date: datetime):
+    """Record that a factory's logs for the month of date changed"""
+    await db[VERSIONS_COLLECTION].update_one(
+        {"_id": factory_id},
+        {"$inc": {"version": 1, f"months.{month_key(date)}": 1}},
+        upsert=True,
+    )
+
+
+async def database_epoch(db) -> str:
+    """Random id created once per database, so a reset database never matches old versions"""
+    epoch = await db[VERSIONS_COLLECTION].find_one({"_id": EPOCH_ID})
+    if epoch is None:
+        await db[VERSIONS_COLLECTION].update_one(
+            {"_id": EPOCH_ID}, {"$setOnInsert": {"value": uuid.uuid4().hex}}, upsert=True
+        )
+        epoch = await db[VERSIONS_COLLECTION].find_one({"_id": EPOCH_ID})
+    return epoch["value"]
+
+
+async def data_versions_for(db, query: dict) -> Dict[str, Dict[str, int]]:
+    """Per-factory {month: version} for the factories and months a daily-log query covers"""
+    match = {"_id": query["factory_id"]} if "factory_id" in query else {"_id": {"$ne": EPOCH_ID}}
+    date_filter = query.get("date") or {}
+    first = month_key(date_filter["$gte"]) if "$gte" in date_filter else None
+    last = month_key(date_filter["$lte"]) if "$lte" in date_filter else None
+
+    versions = {}
+    for doc in await db[VERSIONS_COLLECTION].find(match).to_list(length=None):
+        versions[doc["_id"]] = {
+            month: version for month, version in sorted(doc.get("months", {}).items())
+            if (first is None or month >= first) and (last is None or month <= last)
+        }
+    return versions
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Optional, Tuple
+
+FragmentKey = Tuple[Optional[str], str]
+
+
+class ExportCache:
+    """Size-bounded LRU cache of rendered export files on local disk
+
+    The directory may be shared by several worker processes on one host. The disk is the
+    source of truth: a file written by another worker is a hit, file mtimes record the
+    last access, and every write rescans the directory so max_bytes bounds the directory
+    as a whole rather than each worker's share of it.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, suffix: str = ".xlsx"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._scan()
+            self._evict()
+
+    def _scan(self):
+        """Re-index the files on disk, oldest access first"""
+        files = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another worker meanwhile
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._size = sum(self._entries.values())
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached file, for the caller to stream; None on a miss"""
+        with self._lock:
+            path = self.path_for(key)
+            try:
+                os.utime(path)
+                size = path.stat().st_size
+            except FileNotFoundError:
+                if key in self._entries:
+                    self._size -= self._entries.pop(key)
+                self._misses += 1
+                return None
+            # The file may have been written by another worker sharing the directory
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._hits += 1
+        return path
+
+    def put(self, key: str, content: bytes) -> Path:
+        """Write content and rescan the directory; blocking, so async callers run it in a thread"""
+        path = self.path_for(key)
+        # A private temporary name, so workers rendering the same key never swap half-written files
+        with tempfile.NamedTemporaryFile(dir=self.directory, prefix=f"{key}.", suffix=".tmp",
+                                         delete=False) as temporary:
+            temporary.write(content)
+        os.replace(temporary.name, path)
+        with self._lock:
+            self._scan()
+            self._evict()
+        return path
+
+    def clear(self):
+        with self._lock:
+            self._scan()
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        self._size -= self._entries.pop(key)
+        self.path_for(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+class FragmentCache:
+    """In-memory LRU of export fragments, each valid for one data signature"""
+
+    def __init__(self, max_fragments: int):
+        self.max_fragments = max_fragments
+        self._entries: "OrderedDict[FragmentKey, Tuple[Hashable, dict]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: FragmentKey, signature: Hashable) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key: FragmentKey, signature: Hashable, fragment: dict):
+        with self._lock:
+            self._entries[key] = (signature, fragment)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_fragments:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "fragments": len(self._entries),
+            "max_fragments": self.max_fragments,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
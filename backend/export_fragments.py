@@ -0,0 +1,273 @@
+"""Incremental Excel export: per-(factory, month) workbook fragments.
+
+An export is assembled from fragments, one per factory and calendar month. Each
+fragment holds that month's Summary and detail rows plus its statistics partial.
+Closed months are reused from export_cache.FragmentCache for as long as their data
+version and report count are unchanged. Only open or modified months are rebuilt from
+the database, and the fragments are then merged and trimmed to the requested date range.
+"""
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from analytics import PRODUCTION, SALES, STOCK, build_frames
+from export_cache import FragmentKey
+
+SUMMARY = "Summary"
+DETAIL_SHEETS = ["Production Details", "Sales Details", "Stock Details", "Downtime Details"]
+HIDDEN_COLUMNS = ["_factory_id", "_date"]
+STAT_FIELDS = ["reports", "production", "sales", "revenue", "downtime"]
+
+
+def month_start(date: datetime) -> datetime:
+    return datetime(date.year, date.month, 1)
+
+
+def next_month(date: datetime) -> datetime:
+    return datetime(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+
+def month_bounds(month: str) -> Tuple[datetime, datetime]:
+    start = datetime.strptime(month, "%Y-%m")
+    return start, next_month(start)
+
+
+def month_aligned_query(query: dict) -> dict:
+    """Widen a daily-log query's date range to whole calendar months"""
+    aligned = dict(query)
+    date_filter = query.get("date") or {}
+    if date_filter:
+        aligned["date"] = {}
+        if "$gte" in date_filter:
+            aligned["date"]["$gte"] = month_start(date_filter["$gte"])
+        if "$lte" in date_filter:
+            aligned["date"]["$lt"] = next_month(date_filter["$lte"])
+    return aligned
+
+
+def fragment_index_pipeline(query: dict) -> List[dict]:
+    """Report counts per (factory, month) for the logs matching query"""
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": {
+                "factory_id": "$factory_id",
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$date"}},
+            },
+            "reports": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, "factory_id": "$_id.factory_id", "month": "$_id.month", "reports": 1}},
+    ]
+
+
+def fragments_query(keys: Iterable[FragmentKey]) -> dict:
+    """Query selecting every log of the given (factory, month) fragments"""
+    clauses = []
+    for factory_id, month in keys:
+        start, end = month_bounds(month)
+        clauses.append({"factory_id": factory_id, "date": {"$gte": start, "$lt": end}})
+    first = min(clause["date"]["$gte"] for clause in clauses)
+    last = max(clause["date"]["$lt"] for clause in clauses)
+    # The top-level range lets partition routing skip archive years outside the fragments
+    return {"date": {"$gte": first, "$lt": last}, "$or": clauses}
+
+
+def item_detail_sheet(log_columns: pd.DataFrame, item_frame: pd.DataFrame, kind: str,
+                      value_columns: Dict[str, str]) -> pd.DataFrame:
+    """Build a per-product detail sheet for one line item kind"""
+    items = item_frame[item_frame["kind"] == kind]
+    context = log_columns.iloc[items["log"].to_numpy()].reset_index(drop=True)
+    sheet = context[["Report ID", "Date", "Factory"]].copy()
+    sheet["Product"] = items["product"].to_numpy()
+    for source, header in value_columns.items():
+        sheet[header] = items[source].to_numpy()
+    sheet["Unit"] = context["Unit"]
+    sheet["Created By"] = context["Created By"]
+    for column in HIDDEN_COLUMNS:
+        sheet[column] = context[column]
+    return sheet
+
+
+def downtime_sheet(logs: List[dict], log_columns: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for index, log in enumerate(logs):
+        context = {
+            "Report ID": log.get("report_id", "N/A"),
+            "Date": log_columns["Date"].iat[index],
+            "Factory": log_columns["Factory"].iat[index],
+        }
+        hidden = {column: log_columns[column].iat[index] for column in HIDDEN_COLUMNS}
+        downtime_reasons = log.get("downtime_reasons", [])
+
+        if downtime_reasons:
+            # Add row for each downtime reason
+            for downtime in downtime_reasons:
+                if isinstance(downtime, dict):
+                    rows.append({
+                        **context,
+                        "Downtime Reason": downtime.get("reason", "Unknown"),
+                        "Hours": downtime.get("hours", 0),
+                        "Created By": log.get("created_by", "Unknown"),
+                        **hidden,
+                    })
+        elif log.get("downtime_hours", 0) > 0:
+            # Add row even if no specific reasons, but has downtime hours
+            rows.append({
+                **context,
+                "Downtime Reason": "Not specified",
+                "Hours": log.get("downtime_hours", 0),
+                "Created By": log.get("created_by", "Unknown"),
+                **hidden,
+            })
+    columns = ["Report ID", "Date", "Factory", "Downtime Reason", "Hours", "Created By"] + HIDDEN_COLUMNS
+    return pd.DataFrame(rows, columns=columns)
+
+
+def build_sheet_rows(logs: List[dict], names: Dict[str, str], units: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+    """Summary and detail rows for a batch of logs, tagged with hidden factory/date columns
+
+    names and units map factory_id to display name and SKU unit (catalog snapshot lookups).
+    """
+    log_frame, item_frame = build_frames(logs)
+    log_columns = pd.DataFrame({
+        "Report ID": log_frame["report_id"],
+        "Date": log_frame["date"].dt.strftime("%Y-%m-%d").fillna("N/A"),
+        "Factory": log_frame["factory_id"].map(names).fillna(log_frame["factory_id"]),
+        "Unit": log_frame["factory_id"].map(units).fillna("Units"),
+        "Created By": log_frame["created_by"],
+        "_factory_id": log_frame["factory_id"],
+        "_date": log_frame["date"],
+    })
+
+    summary = pd.DataFrame({
+        "Report ID": log_columns["Report ID"],
+        "Date": log_columns["Date"],
+        "Factory": log_columns["Factory"],
+        "Total Production": log_frame["production"],
+        "Total Sales": log_frame["sales"],
+        "Total Revenue": log_frame["revenue"],
+        "Downtime Hours": log_frame["downtime_hours"],
+        "Created By": log_columns["Created By"],
+        "Created At": log_frame["created_at"].dt.strftime("%Y-%m-%d %H:%M:%S").fillna("N/A"),
+        "_factory_id": log_columns["_factory_id"],
+        "_date": log_columns["_date"],
+    })
+
+    return {
+        SUMMARY: summary,
+        "Production Details": item_detail_sheet(log_columns, item_frame, PRODUCTION, {"qty": "Quantity Produced"}),
+        "Sales Details": item_detail_sheet(log_columns, item_frame, SALES, {
+            "qty": "Quantity Sold",
+            "unit_price": "Unit Price",
+            "revenue": "Revenue",
+        }),
+        "Stock Details": item_detail_sheet(log_columns, item_frame, STOCK, {"qty": "Stock Quantity"}),
+        "Downtime Details": downtime_sheet(logs, log_columns),
+    }
+
+
+def statistics_partial(summary: pd.DataFrame) -> dict:
+    """Report count and totals for a set of summary rows"""
+    return {
+        "reports": len(summary),
+        "production": summary["Total Production"].sum(),
+        "sales": summary["Total Sales"].sum(),
+        "revenue": summary["Total Revenue"].sum(),
+        "downtime": summary["Downtime Hours"].sum(),
+    }
+
+
+def split_fragments(sheets: Dict[str, pd.DataFrame]) -> Dict[FragmentKey, dict]:
+    """Split sheet rows into per-(factory, month) fragments with statistics partials"""
+    fragments = {}
+    for name, frame in sheets.items():
+        months = frame["_date"].dt.strftime("%Y-%m").fillna("")
+        for (factory_id, month), rows in frame.groupby([frame["_factory_id"], months], sort=False, dropna=False):
+            fragment = fragments.setdefault((factory_id, month), {"sheets": {}})
+            fragment["sheets"][name] = rows
+
+    for fragment in fragments.values():
+        for name, frame in sheets.items():
+            fragment["sheets"].setdefault(name, frame.iloc[0:0])
+        fragment["stats"] = statistics_partial(fragment["sheets"][SUMMARY])
+    return fragments
+
+
+def merge_fragments(fragments: Dict[FragmentKey, dict], start: Optional[datetime],
+                    end: Optional[datetime]) -> Tuple[Dict[str, pd.DataFrame], List[Tuple[Hashable, dict]]]:
+    """Concatenate fragments newest first, trimmed to [start, end]
+
+    Returns the merged sheets and the (factory_id, statistics partial) of each fragment.
+    Partials of fragments entirely inside the range are reused; edge months are recomputed
+    from their trimmed rows.
+    """
+    pieces = {name: [] for name in [SUMMARY] + DETAIL_SHEETS}
+    partials = []
+    for (factory_id, month), fragment in sorted(fragments.items(), key=lambda item: str(item[0])):
+        month_first, month_end = month_bounds(month) if month else (None, None)
+        covered = month_first is not None and (start is None or month_first >= start) and (
+            end is None or month_end <= end
+        )
+        trimmed = {}
+        for name, frame in fragment["sheets"].items():
+            if not covered:
+                mask = pd.Series(True, index=frame.index)
+                if start is not None:
+                    mask &= frame["_date"] >= start
+                if end is not None:
+                    mask &= frame["_date"] <= end
+                frame = frame[mask]
+            trimmed[name] = frame
+            pieces[name].append(frame)
+        stats = fragment["stats"] if covered else statistics_partial(trimmed[SUMMARY])
+        if stats["reports"]:
+            partials.append((factory_id, stats))
+
+    merged = {}
+    for name, frames in pieces.items():
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Report ID"] + HIDDEN_COLUMNS)
+        # Same-day reports keep creation order, as they come back from the database
+        merged[name] = frame.sort_values(
+            ["_date", "Report ID"], ascending=[False, True], kind="stable"
+        ).reset_index(drop=True) if not frame.empty else frame
+    return merged, partials
+
+
+def statistics_sheet(summary: pd.DataFrame, partials: List[Tuple[Hashable, dict]],
+                     names: Dict[str, str]) -> pd.DataFrame:
+    """Overall and per-factory statistics from merged fragment partials"""
+    by_factory = pd.DataFrame(
+        [{"factory_id": factory_id, **stats} for factory_id, stats in partials],
+        columns=["factory_id"] + STAT_FIELDS,
+    ).groupby("factory_id", sort=False, dropna=False)[STAT_FIELDS].sum()
+    # Factories are listed in order of their most recent report, as in the Summary sheet
+    by_factory = by_factory.reindex(pd.unique(summary["_factory_id"]))
+    totals = {field: by_factory[field].sum() for field in STAT_FIELDS}
+
+    dates = summary["_date"].dropna()
+    date_range_start = dates.min().strftime("%Y-%m-%d") if not dates.empty else "N/A"
+    date_range_end = dates.max().strftime("%Y-%m-%d") if not dates.empty else "N/A"
+
+    stats_data = [
+        {"Metric": "Total Reports", "Value": int(totals["reports"])},
+        {"Metric": "Unique Factories", "Value": len(by_factory)},
+        {"Metric": "Date Range Start", "Value": date_range_start},
+        {"Metric": "Date Range End", "Value": date_range_end},
+        {"Metric": "Total Production", "Value": totals["production"]},
+        {"Metric": "Total Sales Quantity", "Value": totals["sales"]},
+        {"Metric": "Total Revenue", "Value": f"{totals['revenue']:.2f}"},
+        {"Metric": "Total Downtime Hours", "Value": totals["downtime"]},
+    ]
+
+    # Add factory-wise statistics
+    for factory_id, stats in by_factory.to_dict("index").items():
+        factory_name = names.get(factory_id, factory_id)
+        stats_data.extend([
+            {"Metric": f"{factory_name} - Reports", "Value": int(stats["reports"])},
+            {"Metric": f"{factory_name} - Production", "Value": stats["production"]},
+            {"Metric": f"{factory_name} - Sales", "Value": stats["sales"]},
+            {"Metric": f"{factory_name} - Revenue", "Value": f"{stats['revenue']:.2f}"},
+            {"Metric": f"{factory_name} - Downtime Hours", "Value": stats["downtime"]},
+        ])
+    return pd.DataFrame(stats_data)
@@ -0,0 +1,180 @@
+"""Flattened line-item storage layout for daily logs.
+
+The legacy ("nested") layout keeps production_data, stock_data and sales_data as dicts
+keyed by product name. The "line_items" layout stores them instead as one indexed array:
+
+    items: [{"product": "600ml", "kind": "sales", "qty": 120, "unit_price": 14.5}, ...]
+
+The API keeps exposing the nested shape; expand_line_items() converts on read, so the
+collection can hold a mix of both layouts while a migration is running.
+LOG_STORAGE_LAYOUT only picks the layout of new logs: an update is written in the layout
+its stored document already has.
+
+Usage (from the backend directory):
+    python line_items.py migrate      # nested -> line_items
+    python line_items.py rollback     # line_items -> nested
+"""
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+LAYOUT_NESTED = "nested"
+LAYOUT_LINE_ITEMS = "line_items"
+LOG_STORAGE_LAYOUT = os.getenv("LOG_STORAGE_LAYOUT", LAYOUT_NESTED)
+
+NESTED_FIELDS = {"production": "production_data", "sales": "sales_data", "stock": "stock_data"}
+
+
+def line_items_enabled() -> bool:
+    return LOG_STORAGE_LAYOUT == LAYOUT_LINE_ITEMS
+
+
+def to_line_items(production_data: Optional[dict] = None, sales_data: Optional[dict] = None,
+                  stock_data: Optional[dict] = None) -> List[dict]:
+    """Flatten the nested per-product dicts into a list of line items"""
+    items = []
+    for product, qty in (production_data or {}).items():
+        items.append({"product": product, "kind": "production", "qty": qty, "unit_price": None})
+    for product, sale in (sales_data or {}).items():
+        if isinstance(sale, dict):
+            items.append({
+                "product": product,
+                "kind": "sales",
+                "qty": sale.get("amount", 0),
+                "unit_price": sale.get("unit_price", 0),
+            })
+    for product, qty in (stock_data or {}).items():
+        items.append({"product": product, "kind": "stock", "qty": qty, "unit_price": None})
+    return items
+
+
+def from_line_items(items: List[dict]) -> Dict[str, dict]:
+    """Rebuild the nested production_data/sales_data/stock_data dicts from line items"""
+    nested = {field: {} for field in NESTED_FIELDS.values()}
+    for item in items:
+        kind = item.get("kind")
+        if kind == "sales":
+            nested["sales_data"][item["product"]] = {
+                "amount": item.get("qty", 0),
+                "unit_price": item.get("unit_price", 0),
+            }
+        elif kind in NESTED_FIELDS:
+            nested[NESTED_FIELDS[kind]][item["product"]] = item.get("qty", 0)
+    return nested
+
+
+def expand_line_items(log: dict) -> dict:
+    """Compatibility layer: present a stored log in the nested API shape"""
+    if "items" in log:
+        log.update(from_line_items(log.pop("items")))
+    return log
+
+
+def storage_document(log: dict) -> dict:
+    """Convert a nested log document into the configured storage layout"""
+    if not line_items_enabled():
+        return log
+    document = {key: value for key, value in log.items() if key not in NESTED_FIELDS.values()}
+    document["items"] = to_line_items(
+        log.get("production_data"), log.get("sales_data"), log.get("stock_data")
+    )
+    return document
+
+
+def storage_update(stored_log: dict, update_data: dict) -> dict:
+    """Translate a partial nested update into a $set for the stored log's layout"""
+    # Follow the document, not LOG_STORAGE_LAYOUT: setting nested fields next to items
+    # (or the reverse) would be shadowed on read by the stale representation
+    if "items" not in stored_log:
+        return update_data
+
+    changed = {field: update_data.pop(field) for field in NESTED_FIELDS.values() if field in update_data}
+    if changed:
+        current = expand_line_items(dict(stored_log))
+        merged = {field: changed.get(field, current.get(field)) for field in NESTED_FIELDS.values()}
+        update_data["items"] = to_line_items(
+            merged["production_data"], merged["sales_data"], merged["stock_data"]
+        )
+    return update_data
+
+
+def product_daily_pipeline(query: dict) -> List[dict]:
+    """Server-side per (factory, day, product, kind) quantity sums over line items"""
+    return [
+        {"$match": {**query, "items": {"$exists": True}}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "factory_id": "$factory_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                "product": "$items.product",
+                "kind": "$items.kind",
+            },
+            "qty": {"$sum": "$items.qty"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "factory_id": "$_id.factory_id",
+            "day": "$_id.day",
+            "product": "$_id.product",
+            "kind": "$_id.kind",
+            "qty": 1,
+        }},
+    ]
+
+
+def _migrate(collection, to_layout: str, batch_size: int = 500) -> int:
+    from pymongo import UpdateOne
+
+    if to_layout == LAYOUT_LINE_ITEMS:
+        selector = {"items": {"$exists": False}}
+    else:
+        selector = {"items": {"$exists": True}}
+
+    converted = 0
+    operations = []
+    for log in collection.find(selector):
+        if to_layout == LAYOUT_LINE_ITEMS:
+            update = {
+                "$set": {"items": to_line_items(
+                    log.get("production_data"), log.get("sales_data"), log.get("stock_data")
+                )},
+                "$unset": {field: "" for field in NESTED_FIELDS.values()},
+            }
+        else:
+            update = {"$set": from_line_items(log["items"]), "$unset": {"items": ""}}
+        operations.append(UpdateOne({"_id": log["_id"]}, update))
+        if len(operations) >= batch_size:
+            converted += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        converted += collection.bulk_write(operations, ordered=False).modified_count
+    return converted
+
+
+def main(argv: List[str]):
+    from dotenv import load_dotenv
+    from pathlib import Path
+    from pymongo import MongoClient
+
+    if len(argv) != 1 or argv[0] not in ("migrate", "rollback"):
+        print(__doc__)
+        return 2
+
+    load_dotenv(Path(__file__).parent / ".env")
+    collection = MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]].daily_logs
+
+    started = datetime.utcnow()
+    if argv[0] == "migrate":
+        converted = _migrate(collection, LAYOUT_LINE_ITEMS)
+        print(f"Converted {converted} logs to the line_items layout; set LOG_STORAGE_LAYOUT=line_items")
+    else:
+        converted = _migrate(collection, LAYOUT_NESTED)
+        print(f"Converted {converted} logs back to the nested layout; unset LOG_STORAGE_LAYOUT")
+    print(f"Done in {(datetime.utcnow() - started).total_seconds():.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,101 @@
+"""Per-log totals persisted on daily log documents at write time.
+
+create_daily_log and update_daily_log store total_production, total_sales,
+total_revenue and total_stock next to the per-product data, so summary views can sum
+a few scalar fields server-side instead of hydrating and walking whole documents.
+
+Usage (from the backend directory):
+    python log_totals.py backfill     # compute totals for logs written before this change
+"""
+import os
+import sys
+from typing import List, Optional
+
+from line_items import NESTED_FIELDS, expand_line_items
+
+TOTAL_FIELDS = ["total_production", "total_sales", "total_revenue", "total_stock"]
+
+
+def compute_log_totals(production_data: Optional[dict] = None, sales_data: Optional[dict] = None,
+                       stock_data: Optional[dict] = None) -> dict:
+    sales = [item for item in (sales_data or {}).values() if isinstance(item, dict)]
+    return {
+        "total_production": sum((production_data or {}).values()),
+        "total_sales": sum(item.get("amount", 0) for item in sales),
+        "total_revenue": float(sum(item.get("amount", 0) * item.get("unit_price", 0) for item in sales)),
+        "total_stock": sum((stock_data or {}).values()),
+    }
+
+
+def totals_for(log: dict) -> dict:
+    """Totals for a log document in the nested shape"""
+    return compute_log_totals(log.get("production_data"), log.get("sales_data"), log.get("stock_data"))
+
+
+def totals_update(stored_log: dict, update_data: dict) -> dict:
+    """Totals to $set alongside a partial update, or {} when no per-product data changed"""
+    if not any(field in update_data for field in NESTED_FIELDS.values()):
+        return {}
+    merged = expand_line_items(dict(stored_log))
+    merged.update({field: update_data[field] for field in NESTED_FIELDS.values() if field in update_data})
+    return totals_for(merged)
+
+
+def factory_totals_pipeline(query: dict) -> List[dict]:
+    """Server-side per-factory sums over the stored totals"""
+    return [
+        {"$match": {**query, "total_stock": {"$exists": True}}},
+        {"$group": {
+            "_id": "$factory_id",
+            "production": {"$sum": "$total_production"},
+            "sales": {"$sum": "$total_sales"},
+            "revenue": {"$sum": "$total_revenue"},
+            "stock": {"$sum": "$total_stock"},
+            "downtime": {"$sum": "$downtime_hours"},
+            "reports": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "factory_id": "$_id",
+            "production": 1,
+            "sales": 1,
+            "revenue": 1,
+            "stock": 1,
+            "downtime": 1,
+            "reports": 1,
+        }},
+    ]
+
+
+def backfill(collection, batch_size: int = 500) -> int:
+    from pymongo import UpdateOne
+
+    updated = 0
+    operations = []
+    for log in collection.find({"total_stock": {"$exists": False}}):
+        operations.append(UpdateOne({"_id": log["_id"]}, {"$set": totals_for(expand_line_items(log))}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def main(argv: List[str]):
+    from dotenv import load_dotenv
+    from pathlib import Path
+    from pymongo import MongoClient
+
+    if argv != ["backfill"]:
+        print(__doc__)
+        return 2
+
+    load_dotenv(Path(__file__).parent / ".env")
+    collection = MongoClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]].daily_logs
+    print(f"Backfilled totals on {backfill(collection)} logs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,21 +1,51 @@
+from readiness import readiness  # first, so import-to-ready timing covers every other import
+
+import asyncio
+import hashlib
+import hmac
+import importlib
+import json
 import os
 import logging
 import uuid
+from collections import Counter
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
 from io import BytesIO
 
 import jwt
-import pandas as pd
 from dotenv import load_dotenv
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Response
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, status, Response
+from fastapi.responses import FileResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
 from passlib.context import CryptContext
 from pydantic import BaseModel, Field
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
 from starlette.middleware.cors import CORSMiddleware
 
+from admission import admission_stats, export_limiter, login_limiter, trends_limiter, trends_weight
+from archive import ROLLUP_COLLECTION, archive_catalog, rollup_totals_pipeline
+from catalog import CatalogSnapshot, factory_catalog, save_factory, seed_catalog
+from data_versions import bump_data_version, data_versions_for, database_epoch, month_key
+from export_cache import ExportCache, FragmentCache
+from line_items import (
+    expand_line_items, line_items_enabled, product_daily_pipeline, storage_document, storage_update,
+)
+from log_totals import factory_totals_pipeline, totals_for, totals_update
+from singleflight import analytics_flight, user_scope
+from user_directory import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, USER_INDEXES, USER_PROJECTION, backfill_search_keys, directory_query,
+    search_keys, search_keys_update,
+)
+
+# pandas-backed modules are imported on first use and preloaded by warm_up() after startup
+HEAVY_MODULES = ["pandas", "openpyxl", "analytics", "export_fragments"]
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 # Configuration
 ROOT_DIR = Path(__file__).parent
@@ -25,6 +55,22 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 
+# Largest number of logs a single batch edit/delete request may touch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 500))
+
+# Rendered Excel exports, keyed by filters, scope and data version
+EXPORT_CACHE_DIR = Path(os.getenv("EXPORT_CACHE_DIR", ROOT_DIR / "export_cache"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES)
+
+# Per-(factory, month) export fragments reused across multi-month exports
+fragment_cache = FragmentCache(int(os.getenv("EXPORT_FRAGMENT_CACHE_SIZE", 600)))
+
+# Per-(factory, month) day x series blocks behind anomaly detection
+anomaly_blocks = FragmentCache(int(os.getenv("ANOMALY_BLOCK_CACHE_SIZE", 600)))
+MAX_ANOMALY_DAYS = int(os.getenv("MAX_ANOMALY_DAYS", 3 * 365))
+MAX_ANOMALY_WINDOW = int(os.getenv("MAX_ANOMALY_WINDOW", 90))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
@@ -38,35 +84,6 @@ security = HTTPBearer()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Factory Configuration
-FACTORIES = {
-    "amen_water": {
-        "name": "Amen (Victory) Water",
-        "products": ["360ml", "600ml", "1000ml", "2000ml"],
-        "sku_unit": "Paket"
-    },
-    "mintu_plast": {
-        "name": "Mintu Plast",
-        "products": [
-            "Preform 27g/28mm", "Preform 28g/28mm", "Preform 42g/28mm", 
-            "Preform 24g/28mm", "Preform 20g/28mm", "Preform 39g/30mm",
-            "Preform 17.5g/30mm", "Preform 15g/30mm", "Cap 1.75g/30mm", "Cap 2.6g/28mm"
-        ],
-        "sku_unit": "Pieces"
-    },
-    "mintu_export": {
-        "name": "Mintu Export",
-        "products": ["Sesame", "Niger", "Chickpea", "Red Bean"],
-        "sku_unit": "Quintal"
-    },
-    "wakene_food": {
-        "name": "Wakene Food Complex",
-        "products": ["Flour", "Fruska (Wheat Bran)", "Fruskelo (Wheat Germ)"],
-        "sku_unit": "Quintal"
-    }
-}
-
-
 # Models
 class DowntimeReason(BaseModel):
     reason: str
@@ -126,6 +143,12 @@ class Token(BaseModel):
     token_type: str
 
 
+class FactoryConfig(BaseModel):
+    name: str
+    products: List[str]
+    sku_unit: str
+
+
 class DailyLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     report_id: str
@@ -158,6 +181,19 @@ class DailyLogUpdate(BaseModel):
     stock_data: Optional[Dict[str, int]] = None
 
 
+class DailyLogSelection(BaseModel):
+    # Either explicit ids, or a filter with the same meaning as GET /daily-logs
+    log_ids: Optional[List[str]] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    factory_id: Optional[str] = None
+
+
+class DailyLogBatchUpdate(DailyLogSelection):
+    changes: DailyLogUpdate = Field(default_factory=DailyLogUpdate)
+    unit_prices: Optional[Dict[str, float]] = None  # product -> corrected unit price in sales_data
+
+
 # Create FastAPI app
 app = FastAPI(title="Factory Management System", version="1.0.0", docs_url="/admin-panel", redoc_url=None)
 api_router = APIRouter(prefix="/api")
@@ -224,6 +260,9 @@ async def get_next_report_id():
     
     result = await db.daily_logs.aggregate(pipeline).to_list(length=1)
     next_number = result[0]["report_number"] + 1 if result else 10000
+    
+    # Archived logs left the hot collection but their numbers stay taken
+    next_number = max(next_number, await archive_catalog.max_report_number(db) + 1)
     return f"RPT-{next_number:05d}"
 
 
@@ -250,35 +289,112 @@ def build_query_filters(current_user: dict, start_date: Optional[str] = None,
     return query
 
 
-def calculate_totals_from_log(log: dict):
-    """Calculate total production, sales, and revenue from a log entry"""
-    production_data = log.get("production_data", {})
-    sales_data = log.get("sales_data", {})
+async def find_daily_logs(query: dict, newest_first: bool = False, hot_only: bool = False) -> List[dict]:
+    """Fetch daily logs in the nested API shape from every partition the query touches"""
+    collections = [db.daily_logs] if hot_only else await archive_catalog.collections_for(db, query)
+    
+    logs, seen = [], set()
+    for collection in collections:
+        cursor = collection.find(query)
+        if newest_first:
+            cursor = cursor.sort("date", -1)
+        # While a log is being archived it can sit in both the hot collection and its partition
+        for log in await cursor.to_list(length=None):
+            if log["_id"] not in seen:
+                seen.add(log["_id"])
+                logs.append(log)
+    
+    if newest_first and len(collections) > 1:
+        logs.sort(key=lambda log: log["date"], reverse=True)
+    return [expand_line_items(log) for log in logs]
+
+
+async def find_archived_log(log_id: str) -> Optional[dict]:
+    for collection in (await archive_catalog.collections_for(db, {}))[1:]:
+        log = await collection.find_one({"id": log_id})
+        if log:
+            return log
+    return None
+
+
+async def find_archived_ids(log_ids: List[str]) -> set:
+    archived = set()
+    for collection in (await archive_catalog.collections_for(db, {}))[1:]:
+        logs = await collection.find({"id": {"$in": log_ids}}, {"id": 1}).to_list(length=None)
+        archived.update(log["id"] for log in logs)
+    return archived
+
+
+async def load_item_frame(query: dict) -> "pd.DataFrame":
+    """Per (factory, day, product, kind) quantities for the logs matching query"""
+    import pandas as pd
+    from analytics import build_frames
+    
+    if not line_items_enabled():
+        _, item_frame = build_frames(await find_daily_logs(query))
+        return item_frame
     
-    total_production = sum(production_data.values()) if production_data else 0
-    total_sales = sum(
-        item.get("amount", 0) if isinstance(item, dict) else 0 
-        for item in sales_data.values()
-    ) if sales_data else 0
+    # Line-item documents are grouped server-side; logs not migrated yet go through the kernel
+    rows = []
+    for collection in await archive_catalog.collections_for(db, query):
+        rows.extend(await collection.aggregate(product_daily_pipeline(query)).to_list(length=None))
+    _, legacy_items = build_frames(await find_daily_logs({**query, "items": {"$exists": False}}))
+    columns = ["factory_id", "day", "product", "kind", "qty"]
+    # Skip empty parts, whose float columns would turn integer quantities into floats
+    frames = [frame for frame in (pd.DataFrame(rows, columns=columns), legacy_items[columns]) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else legacy_items[columns]
+
+
+async def load_factory_totals(query: dict) -> "pd.DataFrame":
+    """Per-factory production/sales/revenue/stock/downtime sums and report counts"""
+    import pandas as pd
+    from analytics import build_frames, factory_totals
+    
+    if "date" in query:
+        sources = [
+            (collection, factory_totals_pipeline(query))
+            for collection in await archive_catalog.collections_for(db, query)
+        ]
+    else:
+        # All-time summaries read archived history from the per-month rollups
+        sources = [
+            (db.daily_logs, factory_totals_pipeline(query)),
+            (db[ROLLUP_COLLECTION], rollup_totals_pipeline(query)),
+        ]
     
-    total_revenue = sum(
-        (item.get("amount", 0) * item.get("unit_price", 0)) if isinstance(item, dict) else 0
-        for item in sales_data.values()
-    ) if sales_data else 0
+    rows = []
+    for collection, pipeline in sources:
+        rows.extend(await collection.aggregate(pipeline).to_list(length=None))
+    frames = [pd.DataFrame(rows).set_index("factory_id")] if rows else []
     
-    return total_production, total_sales, total_revenue
+    # Logs written before totals were stored are summed from their line items
+    # (archiving always stores totals, so only the hot collection can hold such logs)
+    legacy_logs = await find_daily_logs({**query, "total_stock": {"$exists": False}}, hot_only=True)
+    if legacy_logs:
+        log_frame, _ = build_frames(legacy_logs)
+        frames.append(factory_totals(log_frame))
+    
+    columns = ["production", "sales", "revenue", "stock", "downtime", "reports"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames)[columns].groupby(level=0, sort=False, dropna=False).sum()
 
 
 # Authentication endpoints
 @api_router.post("/auth/login", response_model=Token)
 async def login(user_data: LoginRequest):
-    user = await db.users.find_one({"username": user_data.username})
-    if not user or not verify_password(user_data.password, user["password_hash"]):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid username or password",
-            headers={"WWW-Authenticate": "Bearer"},
+    async with login_limiter.slot(user_data.username):
+        user = await db.users.find_one({"username": user_data.username})
+        # bcrypt runs off the event loop, so the slot bounds concurrent hashing work
+        verified = user is not None and await asyncio.to_thread(
+            verify_password, user_data.password, user["password_hash"]
         )
+        if not verified:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid username or password",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -294,8 +410,27 @@ async def read_users_me(current_user: dict = Depends(get_current_user)):
 
 # Factory configuration endpoints
 @api_router.get("/factories")
-async def get_factories():
-    return FACTORIES
+async def get_factories(request: Request, response: Response):
+    catalog = await factory_catalog.snapshot(db)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == catalog.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return catalog.factories
+
+
+@api_router.put("/factories/{factory_id}")
+async def put_factory(factory_id: str, factory: FactoryConfig, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "headquarters":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    products = [product.strip() for product in factory.products]
+    if not all(products) or len(set(products)) != len(products):
+        raise HTTPException(status_code=400, detail="Products must be unique and non-empty")
+    
+    await save_factory(db, factory_id, {"name": factory.name, "products": products, "sku_unit": factory.sku_unit})
+    catalog = await factory_catalog.snapshot(db)
+    return {"factory_id": factory_id, **catalog.factories[factory_id], "version": catalog.version}
 
 
 # Daily logs endpoints
@@ -306,12 +441,14 @@ async def create_daily_log(log_data: DailyLogCreate, current_user: dict = Depend
         raise HTTPException(status_code=403, detail="Cannot create logs for other factories")
     
     # Check if log already exists
-    existing_log = await db.daily_logs.find_one({
-        "date": datetime.fromisoformat(log_data.date),
-        "factory_id": log_data.factory_id
-    })
-    if existing_log:
-        raise HTTPException(status_code=400, detail="Daily log already exists for this date and factory")
+    log_date = datetime.fromisoformat(log_data.date)
+    for collection in await archive_catalog.collections_for(db, {"date": {"$gte": log_date, "$lte": log_date}}):
+        existing_log = await collection.find_one({
+            "date": log_date,
+            "factory_id": log_data.factory_id
+        })
+        if existing_log:
+            raise HTTPException(status_code=400, detail="Daily log already exists for this date and factory")
     
     # Generate report ID and create log
     report_id = await get_next_report_id()
@@ -327,10 +464,15 @@ async def create_daily_log(log_data: DailyLogCreate, current_user: dict = Depend
         created_by=current_user["username"]
     )
     
-    result = await db.daily_logs.insert_one(daily_log.dict())
+    log_document = daily_log.dict()
+    log_document.update(totals_for(log_document))
+    
+    result = await db.daily_logs.insert_one(storage_document(log_document))
     if not result.inserted_id:
         raise HTTPException(status_code=500, detail="Failed to create daily log")
     
+    await bump_data_version(db, daily_log.factory_id, daily_log.date)
+    
     return {"message": "Daily log created successfully", "report_id": report_id}
 
 
@@ -347,7 +489,7 @@ async def get_daily_logs(
     if created_by_me:
         query["created_by"] = current_user["username"]
     
-    logs = await db.daily_logs.find(query).sort("date", -1).to_list(length=None)
+    logs = await find_daily_logs(query, newest_first=True)
     
     # Format response
     for log in logs:
@@ -360,20 +502,16 @@ async def get_daily_logs(
     return logs
 
 
-@api_router.put("/daily-logs/{log_id}")
-async def update_daily_log(log_id: str, log_update: DailyLogUpdate, current_user: dict = Depends(get_current_user)):
-    log = await db.daily_logs.find_one({"id": log_id})
-    if not log:
-        raise HTTPException(status_code=404, detail="Daily log not found")
-    
-    # Check permissions
+def log_permission_error(log: dict, current_user: dict, action: str) -> Optional[str]:
+    """Reason the user may not edit/delete log, or None if allowed"""
     if log["created_by"] != current_user["username"]:
-        raise HTTPException(status_code=403, detail="Can only edit your own logs")
-    
+        return f"Can only {action} your own logs"
     if current_user["role"] == "factory_employer" and log["factory_id"] != current_user.get("factory_id"):
-        raise HTTPException(status_code=403, detail="Cannot edit logs from other factories")
-    
-    # Prepare update data
+        return f"Cannot {action} logs from other factories"
+    return None
+
+
+def log_update_fields(log_update: DailyLogUpdate) -> dict:
     update_data = {}
     for field in ["production_data", "sales_data", "downtime_hours", "stock_data"]:
         value = getattr(log_update, field)
@@ -382,14 +520,38 @@ async def update_daily_log(log_id: str, log_update: DailyLogUpdate, current_user
     
     if log_update.downtime_reasons is not None:
         update_data["downtime_reasons"] = [reason.dict() for reason in log_update.downtime_reasons]
+    return update_data
+
+
+@api_router.put("/daily-logs/{log_id}")
+async def update_daily_log(log_id: str, log_update: DailyLogUpdate, current_user: dict = Depends(get_current_user)):
+    log = await db.daily_logs.find_one({"id": log_id})
+    if not log:
+        if await find_archived_log(log_id):
+            raise HTTPException(status_code=409, detail="Archived logs are read-only")
+        raise HTTPException(status_code=404, detail="Daily log not found")
+    if await archive_catalog.is_read_only(db, log):
+        raise HTTPException(status_code=409, detail="Archived logs are read-only")
+    
+    # Check permissions
+    permission_error = log_permission_error(log, current_user, "edit")
+    if permission_error:
+        raise HTTPException(status_code=403, detail=permission_error)
+    
+    # Prepare update data
+    update_data = log_update_fields(log_update)
     
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update")
     
+    update_data.update(totals_update(log, update_data))
+    update_data = storage_update(log, update_data)
     result = await db.daily_logs.update_one({"id": log_id}, {"$set": update_data})
     if result.modified_count == 0:
         raise HTTPException(status_code=500, detail="Failed to update daily log")
     
+    await bump_data_version(db, log["factory_id"], log["date"])
+    
     return {"message": "Daily log updated successfully"}
 
 
@@ -397,59 +559,171 @@ async def update_daily_log(log_id: str, log_update: DailyLogUpdate, current_user
 async def delete_daily_log(log_id: str, current_user: dict = Depends(get_current_user)):
     log = await db.daily_logs.find_one({"id": log_id})
     if not log:
+        if await find_archived_log(log_id):
+            raise HTTPException(status_code=409, detail="Archived logs are read-only")
         raise HTTPException(status_code=404, detail="Daily log not found")
+    if await archive_catalog.is_read_only(db, log):
+        raise HTTPException(status_code=409, detail="Archived logs are read-only")
     
     # Check permissions
-    if log["created_by"] != current_user["username"]:
-        raise HTTPException(status_code=403, detail="Can only delete your own logs")
-    
-    if current_user["role"] == "factory_employer" and log["factory_id"] != current_user.get("factory_id"):
-        raise HTTPException(status_code=403, detail="Cannot delete logs from other factories")
+    permission_error = log_permission_error(log, current_user, "delete")
+    if permission_error:
+        raise HTTPException(status_code=403, detail=permission_error)
     
     result = await db.daily_logs.delete_one({"id": log_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Failed to delete daily log")
     
+    await bump_data_version(db, log["factory_id"], log["date"])
+    
     return {"message": "Daily log deleted successfully"}
 
 
+# Batch edit/delete: one query selects and permission-checks the whole set, one bulk_write applies it
+def batch_outcome(log_id: str, status_code: int, detail: str) -> dict:
+    return {"id": log_id, "status_code": status_code, "detail": detail}
+
+
+async def select_batch_logs(selection: DailyLogSelection, current_user: dict, action: str):
+    """Logs the user may change, plus outcomes for every selected id that cannot be changed"""
+    if selection.log_ids:
+        requested = list(dict.fromkeys(selection.log_ids))
+        if len(requested) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"A batch can change at most {MAX_BATCH_SIZE} logs")
+        query = {"id": {"$in": requested}}
+    elif selection.start_date or selection.end_date or selection.factory_id:
+        requested = None
+        query = build_query_filters(current_user, selection.start_date, selection.end_date, selection.factory_id)
+    else:
+        raise HTTPException(status_code=400, detail="Provide log_ids or a filter")
+    
+    logs = await db.daily_logs.find(query).to_list(length=MAX_BATCH_SIZE + 1)
+    if len(logs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch can change at most {MAX_BATCH_SIZE} logs")
+    
+    outcomes = {}
+    if requested is not None:
+        found = {log["id"] for log in logs}
+        missing = [log_id for log_id in requested if log_id not in found]
+        archived = await find_archived_ids(missing) if missing else set()
+        for log_id in missing:
+            if log_id in archived:
+                outcomes[log_id] = batch_outcome(log_id, 409, "Archived logs are read-only")
+            else:
+                outcomes[log_id] = batch_outcome(log_id, 404, "Daily log not found")
+    else:
+        requested = [log["id"] for log in logs]
+    
+    allowed = []
+    for log in logs:
+        permission_error = log_permission_error(log, current_user, action)
+        if await archive_catalog.is_read_only(db, log):
+            outcomes[log["id"]] = batch_outcome(log["id"], 409, "Archived logs are read-only")
+        elif permission_error:
+            outcomes[log["id"]] = batch_outcome(log["id"], 403, permission_error)
+        else:
+            allowed.append(log)
+    return requested, allowed, outcomes
+
+
+async def apply_batch(requested: List[str], operations: list, outcomes: dict, detail: str) -> dict:
+    """Run (log, operation) pairs in one unordered bulk_write and report an outcome per requested id"""
+    failed = {}
+    if operations:
+        try:
+            await db.daily_logs.bulk_write([operation for _, operation in operations], ordered=False)
+        except BulkWriteError as error:
+            failed = {write_error["index"]: write_error.get("errmsg") for write_error in error.details["writeErrors"]}
+    
+    changed_months = {}
+    for index, (log, _) in enumerate(operations):
+        if index in failed:
+            logger.error(f"Batch write failed for log {log['id']}: {failed[index]}")
+            outcomes[log["id"]] = batch_outcome(log["id"], 500, "Write failed")
+        else:
+            outcomes[log["id"]] = batch_outcome(log["id"], 200, detail)
+            changed_months.setdefault((log["factory_id"], month_key(log["date"])), log["date"])
+    
+    for (factory_id, _), date in changed_months.items():
+        await bump_data_version(db, factory_id, date)
+    
+    results = [outcomes[log_id] for log_id in requested]
+    succeeded = sum(1 for result in results if result["status_code"] == 200)
+    return {"requested": len(results), "succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+
+@api_router.post("/daily-logs/batch-update")
+async def batch_update_daily_logs(batch: DailyLogBatchUpdate, current_user: dict = Depends(get_current_user)):
+    changes = log_update_fields(batch.changes)
+    if not changes and not batch.unit_prices:
+        raise HTTPException(status_code=400, detail="No valid fields to update")
+    
+    requested, logs, outcomes = await select_batch_logs(batch, current_user, "edit")
+    
+    operations = []
+    for log in logs:
+        update_data = dict(changes)
+        if batch.unit_prices:
+            sales_data = update_data.get("sales_data") or expand_line_items(dict(log)).get("sales_data", {})
+            if not any(product in sales_data for product in batch.unit_prices) and not changes:
+                outcomes[log["id"]] = batch_outcome(log["id"], 200, "No matching products")
+                continue
+            update_data["sales_data"] = {
+                product: {**sale, "unit_price": batch.unit_prices[product]}
+                if product in batch.unit_prices and isinstance(sale, dict) else sale
+                for product, sale in sales_data.items()
+            }
+        update_data.update(totals_update(log, update_data))
+        operations.append((log, UpdateOne({"_id": log["_id"]}, {"$set": storage_update(log, update_data)})))
+    
+    return await apply_batch(requested, operations, outcomes, "Daily log updated successfully")
+
+
+@api_router.post("/daily-logs/batch-delete")
+async def batch_delete_daily_logs(selection: DailyLogSelection, current_user: dict = Depends(get_current_user)):
+    requested, logs, outcomes = await select_batch_logs(selection, current_user, "delete")
+    operations = [(log, DeleteOne({"_id": log["_id"]})) for log in logs]
+    return await apply_batch(requested, operations, outcomes, "Daily log deleted successfully")
+
+
 # Analytics endpoints
 @api_router.get("/dashboard-summary")
 async def get_dashboard_summary(current_user: dict = Depends(get_current_user)):
-    query = build_query_filters(current_user)
-    logs = await db.daily_logs.find(query).to_list(length=None)
+    from analytics import to_native
     
-    total_downtime = sum(log.get("downtime_hours", 0) for log in logs)
-    total_stock = sum(sum(log.get("stock_data", {}).values()) for log in logs)
+    query = build_query_filters(current_user)
+    totals = await load_factory_totals(query)
     
     if current_user["role"] == "factory_employer":
-        active_factories = 1 if logs else 0
+        active_factories = 1 if len(totals) else 0
     else:
-        unique_factories = set(log.get("factory_id") for log in logs)
-        active_factories = len(unique_factories)
+        active_factories = len(totals)
     
     return {
-        "total_downtime": total_downtime,
+        "total_downtime": to_native(totals["downtime"].sum()),
         "active_factories": active_factories,
-        "total_stock": total_stock
+        "total_stock": to_native(totals["stock"].sum())
     }
 
 
 @api_router.get("/analytics/trends")
 async def get_analytics_trends(days: int = 30, current_user: dict = Depends(get_current_user)):
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
-    
-    query = build_query_filters(current_user, start_date.isoformat(), end_date.isoformat())
-    logs = await db.daily_logs.find(query).to_list(length=None)
+    return await analytics_flight.do(
+        ("trends", days, user_scope(current_user)),
+        lambda: compute_analytics_trends(days, current_user)
+    )
+
+
+async def compute_analytics_trends(days: int, current_user: dict):
+    from analytics import PRODUCTION, SALES, daily_product_series, to_native
     
-    # Group data by factory
-    factories_data = {}
-    for factory_id, factory_config in FACTORIES.items():
-        if current_user["role"] == "factory_employer" and factory_id != current_user.get("factory_id"):
-            continue
-            
-        factory_logs = [log for log in logs if log["factory_id"] == factory_id]
+    async with trends_limiter.slot(current_user["username"], trends_weight(days)):
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        query = build_query_filters(current_user, start_date.isoformat(), end_date.isoformat())
+        item_frame = await load_item_frame(query)
+        catalog = await factory_catalog.snapshot(db)
         
         # Create date range
         dates = []
@@ -458,51 +732,29 @@ async def get_analytics_trends(days: int = 30, current_user: dict = Depends(get_
             dates.append(current_date.strftime("%Y-%m-%d"))
             current_date += timedelta(days=1)
         
-        # Initialize data arrays
-        production_data = []
-        sales_data = []
-        production_by_product = {product: [] for product in factory_config["products"]}
-        sales_by_product = {product: [] for product in factory_config["products"]}
-        
-        # Fill data for each date
-        for date_str in dates:
-            date_obj = datetime.fromisoformat(date_str)
-            day_logs = [log for log in factory_logs if log["date"].date() == date_obj.date()]
-            
-            daily_production = 0
-            daily_sales = 0
+        # Group data by factory
+        factories_data = {}
+        for factory_id, name in catalog.names.items():
+            if current_user["role"] == "factory_employer" and factory_id != current_user.get("factory_id"):
+                continue
             
-            for product in factory_config["products"]:
-                product_production = 0
-                product_sales = 0
-                
-                for log in day_logs:
-                    if product in log.get("production_data", {}):
-                        product_production += log["production_data"][product]
-                    if product in log.get("sales_data", {}):
-                        product_sales += log["sales_data"][product].get("amount", 0)
-                
-                production_by_product[product].append(product_production)
-                sales_by_product[product].append(product_sales)
-                daily_production += product_production
-                daily_sales += product_sales
+            products = catalog.products[factory_id]
+            production = daily_product_series(item_frame, factory_id, PRODUCTION, products, dates)
+            sales = daily_product_series(item_frame, factory_id, SALES, products, dates)
             
-            production_data.append(daily_production)
-            sales_data.append(daily_sales)
+            factories_data[factory_id] = {
+                "name": name,
+                "dates": dates,
+                "production": to_native(production.sum(axis=1)),
+                "sales": to_native(sales.sum(axis=1)),
+                "production_by_product": {product: to_native(production[product]) for product in products},
+                "sales_by_product": {product: to_native(sales[product]) for product in products}
+            }
         
-        factories_data[factory_id] = {
-            "name": factory_config["name"],
-            "dates": dates,
-            "production": production_data,
-            "sales": sales_data,
-            "production_by_product": production_by_product,
-            "sales_by_product": sales_by_product
+        return {
+            "factories": factories_data,
+            "date_range": {"start": start_date.isoformat(), "end": end_date.isoformat()}
         }
-    
-    return {
-        "factories": factories_data,
-        "date_range": {"start": start_date.isoformat(), "end": end_date.isoformat()}
-    }
 
 
 @api_router.get("/analytics/factory-comparison")
@@ -510,45 +762,126 @@ async def get_factory_comparison(current_user: dict = Depends(get_current_user))
     if current_user["role"] != "headquarters":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Get today's data only
     today = datetime.utcnow().date()
+    return await analytics_flight.do(
+        ("factory-comparison", today.isoformat()),
+        lambda: compute_factory_comparison(today)
+    )
+
+
+async def compute_factory_comparison(today):
+    # Get today's data only
     start_of_day = datetime.combine(today, datetime.min.time())
     end_of_day = datetime.combine(today, datetime.max.time())
     
     query = {"date": {"$gte": start_of_day, "$lte": end_of_day}}
-    logs = await db.daily_logs.find(query).to_list(length=None)
+    totals = await load_factory_totals(query)
+    catalog = await factory_catalog.snapshot(db)
+    totals = totals.reindex(list(catalog.names), fill_value=0).to_dict("index")
     
     # Group by factory
     factory_stats = []
-    for factory_id, factory_config in FACTORIES.items():
-        factory_logs = [log for log in logs if log["factory_id"] == factory_id]
-        
-        total_production, total_sales, total_revenue = 0, 0, 0
-        total_downtime = 0
-        
-        for log in factory_logs:
-            prod, sales, revenue = calculate_totals_from_log(log)
-            total_production += prod
-            total_sales += sales
-            total_revenue += revenue
-            total_downtime += log.get("downtime_hours", 0)
+    for factory_id, name in catalog.names.items():
+        stats = totals[factory_id]
+        total_downtime = stats["downtime"]
         
         # Calculate efficiency (assuming 24-hour operation)
         efficiency = ((24 - total_downtime) / 24) * 100 if total_downtime < 24 else 0
         
         factory_stats.append({
-            "name": factory_config["name"],
-            "production": total_production,
-            "sales": total_sales,
-            "revenue": total_revenue,
+            "name": name,
+            "production": stats["production"],
+            "sales": stats["sales"],
+            "revenue": stats["revenue"],
             "downtime": total_downtime,
             "efficiency": round(efficiency, 2),
-            "sku_unit": factory_config["sku_unit"]
+            "sku_unit": catalog.units[factory_id]
         })
     
     return factory_stats
 
 
+@api_router.get("/analytics/anomalies")
+async def get_analytics_anomalies(
+    days: int = Query(90, ge=1, le=MAX_ANOMALY_DAYS),
+    window: int = Query(28, ge=7, le=MAX_ANOMALY_WINDOW),
+    threshold: float = Query(3.5, gt=0),
+    factory_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    return await analytics_flight.do(
+        ("anomalies", days, window, threshold, factory_id, user_scope(current_user)),
+        lambda: compute_analytics_anomalies(days, window, threshold, factory_id, current_user)
+    )
+
+
+async def compute_analytics_anomalies(days: int, window: int, threshold: float, factory_id: Optional[str],
+                                      current_user: dict):
+    from anomalies import assemble_matrix, detect_anomalies
+    
+    async with trends_limiter.slot(current_user["username"], trends_weight(days + window)):
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        history_start = start_date - timedelta(days=window)
+        
+        # Load `window` extra days so the first reported day already has a baseline
+        query = build_query_filters(current_user, history_start.isoformat(), end_date.isoformat(), factory_id)
+        catalog = await factory_catalog.snapshot(db)
+        factory_ids = [fid for fid in catalog.names if query.get("factory_id") in (None, fid)]
+        if not factory_ids:
+            raise HTTPException(status_code=404, detail="Factory not found")
+        blocks = await load_anomaly_blocks(query, factory_ids, catalog)
+        
+        dates = []
+        current_date = history_start
+        while current_date <= end_date:
+            dates.append(current_date.strftime("%Y-%m-%d"))
+            current_date += timedelta(days=1)
+        
+        # The rolling statistics are CPU-bound NumPy work; keep them off the event loop
+        matrix = await asyncio.to_thread(assemble_matrix, blocks, factory_ids, catalog.products, dates)
+        anomalies = await asyncio.to_thread(
+            detect_anomalies, matrix, window, threshold, start_date.strftime("%Y-%m-%d")
+        )
+    
+    for anomaly in anomalies:
+        anomaly["factory_name"] = catalog.names[anomaly["factory_id"]]
+    
+    return {
+        "anomalies": anomalies,
+        "series_checked": matrix.shape[1],
+        "window": window,
+        "threshold": threshold,
+        "date_range": {
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat()
+        }
+    }
+
+
+async def load_anomaly_blocks(query: dict, factory_ids: List[str], catalog: CatalogSnapshot) -> Dict[tuple, Any]:
+    """Per-(factory, month) series blocks covering query, rebuilding only open or changed months"""
+    from anomalies import build_blocks, daily_downtime_pipeline
+    from export_fragments import fragments_query, month_aligned_query
+    
+    signatures = await month_signatures(month_aligned_query(query), catalog)
+    signatures = {key: signature for key, signature in signatures.items() if key[0] in factory_ids}
+    blocks, stale = split_cached_months(anomaly_blocks, signatures)
+    
+    if stale:
+        stale_query = fragments_query(stale)
+        item_frame = await load_item_frame(stale_query)
+        day_rows = []
+        for collection in await archive_catalog.collections_for(db, stale_query):
+            day_rows.extend(await collection.aggregate(daily_downtime_pipeline(stale_query)).to_list(length=None))
+        built = await asyncio.to_thread(build_blocks, item_frame, day_rows, list(stale), catalog.products)
+        for key, block in built.items():
+            anomaly_blocks.put(key, stale[key], block)
+            blocks[key] = block
+    
+    return blocks
+
+
 # Enhanced Excel export with detailed product-level data
 @api_router.get("/export-excel")
 async def export_excel(
@@ -557,268 +890,141 @@ async def export_excel(
     factory_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    logger.info(f"Excel export started by user: {current_user.get('username', 'Unknown')}")
+    logger.info(f"Parameters - start_date: {start_date}, end_date: {end_date}, factory_id: {factory_id}")
+    
+    # Build query filters based on user role and parameters
+    query = build_query_filters(current_user, start_date, end_date, factory_id)
+    logger.info(f"Final query: {query}")
+    
+    # Repeated exports of unchanged data and catalog are served from the render cache
+    catalog = await factory_catalog.snapshot(db)
+    cache_key = export_cache.make_key(
+        query=query,
+        scope=user_scope(current_user),
+        epoch=await database_epoch(db),
+        versions=await data_versions_for(db, query),
+        catalog=catalog.etag,
+        partitions=await archive_catalog.archived_years(db, query)
+    )
+    cached_path = export_cache.get(cache_key)
+    if cached_path is not None:
+        logger.info(f"Serving cached Excel export {cached_path.name}")
+        return excel_file_response(cached_path)
+    
+    async with export_limiter.slot(current_user["username"]):
+        excel_content = await build_excel_export(query, catalog)
+    await asyncio.to_thread(export_cache.put, cache_key, excel_content)
+    return excel_response(excel_content)
+
+
+EXCEL_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def excel_headers() -> Dict[str, str]:
+    # Create filename
+    filename = f"factory_detailed_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    logger.info(f"Sending detailed Excel file: {filename}")
+    return {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Cache-Control": "no-cache, no-store, must-revalidate",
+        "Pragma": "no-cache",
+        "Expires": "0"
+    }
+
+
+def excel_response(excel_content: bytes) -> Response:
+    headers = {**excel_headers(), "Content-Length": str(len(excel_content))}
+    return Response(content=excel_content, media_type=EXCEL_MEDIA_TYPE, headers=headers)
+
+
+def excel_file_response(path: Path) -> FileResponse:
+    # Streamed from disk by the server, so a cache hit never loads the file on the event loop
+    return FileResponse(path, media_type=EXCEL_MEDIA_TYPE, headers=excel_headers())
+
+
+async def month_signatures(aligned: dict, catalog: CatalogSnapshot) -> Dict[tuple, tuple]:
+    """Data and catalog signature of every (factory, month) with logs in a month-aligned query"""
+    from export_fragments import fragment_index_pipeline
+    
+    # A month split by the archive horizon shows up in two partitions, so counts add up
+    reports = Counter()
+    for collection in await archive_catalog.collections_for(db, aligned):
+        for row in await collection.aggregate(fragment_index_pipeline(aligned)).to_list(length=None):
+            reports[(row["factory_id"], row["month"])] += row["reports"]
+    
+    epoch = await database_epoch(db)
+    versions = await data_versions_for(db, aligned)
+    return {
+        (factory_id, month): (epoch, catalog.etag, versions.get(factory_id, {}).get(month, 0), count)
+        for (factory_id, month), count in reports.items()
+    }
+
+
+def split_cached_months(cache: FragmentCache, signatures: Dict[tuple, tuple]):
+    """Cached entries of closed, unchanged months, and the signatures of months to rebuild"""
+    open_month = month_key(datetime.utcnow())
+    cached, stale = {}, {}
+    for key, signature in signatures.items():
+        entry = cache.get(key, signature) if key[1] and key[1] < open_month else None
+        if entry is None:
+            stale[key] = signature
+        else:
+            cached[key] = entry
+    return cached, stale
+
+
+async def load_export_fragments(query: dict, catalog: CatalogSnapshot) -> Dict[tuple, dict]:
+    """Per-(factory, month) fragments covering query, rebuilding only open or changed months"""
+    from export_fragments import build_sheet_rows, fragments_query, month_aligned_query, split_fragments
+    
+    signatures = await month_signatures(month_aligned_query(query), catalog)
+    fragments, stale = split_cached_months(fragment_cache, signatures)
+    reused = len(fragments)
+    
+    if stale:
+        logs = await find_daily_logs(fragments_query(stale), newest_first=True)
+        for key, fragment in split_fragments(build_sheet_rows(logs, catalog.names, catalog.units)).items():
+            if key in stale:
+                fragment_cache.put(key, stale[key], fragment)
+            fragments[key] = fragment
+    
+    logger.info(f"Export fragments: {reused} reused, {len(stale)} rebuilt")
+    return fragments
+
+
+async def build_excel_export(query: dict, catalog: CatalogSnapshot) -> bytes:
+    import pandas as pd
+    from export_fragments import DETAIL_SHEETS, HIDDEN_COLUMNS, SUMMARY, merge_fragments, statistics_sheet
+    
     try:
-        logger.info(f"Excel export started by user: {current_user.get('username', 'Unknown')}")
-        logger.info(f"Parameters - start_date: {start_date}, end_date: {end_date}, factory_id: {factory_id}")
-        
-        # Build query filters based on user role and parameters
-        query = {}
-        
-        if current_user["role"] == "factory_employer":
-            query["factory_id"] = current_user.get("factory_id")
-        elif factory_id:
-            query["factory_id"] = factory_id
-        
-        # Date filtering
-        if start_date or end_date:
-            date_filter = {}
-            if start_date:
-                date_filter["$gte"] = datetime.fromisoformat(start_date)
-            if end_date:
-                date_filter["$lte"] = datetime.fromisoformat(end_date)
-            query["date"] = date_filter
+        # Fetch per-month fragments and merge them into the requested range
+        fragments = await load_export_fragments(query, catalog)
+        date_filter = query.get("date") or {}
+        sheets, partials = merge_fragments(fragments, date_filter.get("$gte"), date_filter.get("$lte"))
+        summary_df = sheets[SUMMARY]
+        logger.info(f"Found {len(summary_df)} logs in database")
         
-        logger.info(f"Final query: {query}")
-        
-        # Fetch data
-        logs = await db.daily_logs.find(query).sort("date", -1).to_list(length=None)
-        logger.info(f"Found {len(logs)} logs in database")
-        
-        if not logs:
+        if summary_df.empty:
             raise HTTPException(status_code=404, detail="No data found for the specified criteria")
         
+        stats_df = statistics_sheet(summary_df, partials, catalog.names)
+        
         # Create Excel file in memory with multiple sheets
         output = BytesIO()
         
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             
             # Sheet 1: Summary Data (like before)
-            summary_data = []
-            for log in logs:
-                # Calculate totals
-                production_data = log.get("production_data", {})
-                sales_data = log.get("sales_data", {})
-                
-                total_production = sum(production_data.values()) if production_data else 0
-                total_sales = sum(
-                    item.get("amount", 0) if isinstance(item, dict) else 0 
-                    for item in sales_data.values()
-                ) if sales_data else 0
-                
-                total_revenue = sum(
-                    (item.get("amount", 0) * item.get("unit_price", 0)) if isinstance(item, dict) else 0
-                    for item in sales_data.values()
-                ) if sales_data else 0
-                
-                # Get factory name
-                factory_name = FACTORIES.get(log.get("factory_id", ""), {}).get("name", log.get("factory_id", "Unknown"))
-                
-                # Format dates safely
-                date_str = log.get("date").strftime("%Y-%m-%d") if log.get("date") else "N/A"
-                created_at_str = log.get("created_at").strftime("%Y-%m-%d %H:%M:%S") if log.get("created_at") else "N/A"
-                
-                summary_data.append({
-                    "Report ID": log.get("report_id", "N/A"),
-                    "Date": date_str,
-                    "Factory": factory_name,
-                    "Total Production": total_production,
-                    "Total Sales": total_sales,
-                    "Total Revenue": total_revenue,
-                    "Downtime Hours": log.get("downtime_hours", 0),
-                    "Created By": log.get("created_by", "Unknown"),
-                    "Created At": created_at_str
-                })
-            
-            # Write summary sheet
-            summary_df = pd.DataFrame(summary_data)
-            summary_df.to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Sheet 2: Detailed Production Data
-            production_details = []
-            for log in logs:
-                production_data = log.get("production_data", {})
-                factory_name = FACTORIES.get(log.get("factory_id", ""), {}).get("name", log.get("factory_id", "Unknown"))
-                date_str = log.get("date").strftime("%Y-%m-%d") if log.get("date") else "N/A"
-                report_id = log.get("report_id", "N/A")
-                
-                # Add row for each product
-                for product, quantity in production_data.items():
-                    production_details.append({
-                        "Report ID": report_id,
-                        "Date": date_str,
-                        "Factory": factory_name,
-                        "Product": product,
-                        "Quantity Produced": quantity,
-                        "Unit": FACTORIES.get(log.get("factory_id", ""), {}).get("sku_unit", "Units"),
-                        "Created By": log.get("created_by", "Unknown")
-                    })
-            
-            if production_details:
-                production_df = pd.DataFrame(production_details)
-                production_df.to_excel(writer, sheet_name='Production Details', index=False)
-            
-            # Sheet 3: Detailed Sales Data
-            sales_details = []
-            for log in logs:
-                sales_data = log.get("sales_data", {})
-                factory_name = FACTORIES.get(log.get("factory_id", ""), {}).get("name", log.get("factory_id", "Unknown"))
-                date_str = log.get("date").strftime("%Y-%m-%d") if log.get("date") else "N/A"
-                report_id = log.get("report_id", "N/A")
-                
-                # Add row for each product sold
-                for product, sale_info in sales_data.items():
-                    if isinstance(sale_info, dict):
-                        amount = sale_info.get("amount", 0)
-                        unit_price = sale_info.get("unit_price", 0)
-                        revenue = amount * unit_price
-                        
-                        sales_details.append({
-                            "Report ID": report_id,
-                            "Date": date_str,
-                            "Factory": factory_name,
-                            "Product": product,
-                            "Quantity Sold": amount,
-                            "Unit Price": unit_price,
-                            "Revenue": revenue,
-                            "Unit": FACTORIES.get(log.get("factory_id", ""), {}).get("sku_unit", "Units"),
-                            "Created By": log.get("created_by", "Unknown")
-                        })
-            
-            if sales_details:
-                sales_df = pd.DataFrame(sales_details)
-                sales_df.to_excel(writer, sheet_name='Sales Details', index=False)
-            
-            # Sheet 4: Stock Data
-            stock_details = []
-            for log in logs:
-                stock_data = log.get("stock_data", {})
-                factory_name = FACTORIES.get(log.get("factory_id", ""), {}).get("name", log.get("factory_id", "Unknown"))
-                date_str = log.get("date").strftime("%Y-%m-%d") if log.get("date") else "N/A"
-                report_id = log.get("report_id", "N/A")
-                
-                # Add row for each product in stock
-                for product, stock_quantity in stock_data.items():
-                    stock_details.append({
-                        "Report ID": report_id,
-                        "Date": date_str,
-                        "Factory": factory_name,
-                        "Product": product,
-                        "Stock Quantity": stock_quantity,
-                        "Unit": FACTORIES.get(log.get("factory_id", ""), {}).get("sku_unit", "Units"),
-                        "Created By": log.get("created_by", "Unknown")
-                    })
-            
-            if stock_details:
-                stock_df = pd.DataFrame(stock_details)
-                stock_df.to_excel(writer, sheet_name='Stock Details', index=False)
-            
-            # Sheet 5: Downtime Details
-            downtime_details = []
-            for log in logs:
-                downtime_reasons = log.get("downtime_reasons", [])
-                factory_name = FACTORIES.get(log.get("factory_id", ""), {}).get("name", log.get("factory_id", "Unknown"))
-                date_str = log.get("date").strftime("%Y-%m-%d") if log.get("date") else "N/A"
-                report_id = log.get("report_id", "N/A")
-                
-                if downtime_reasons:
-                    # Add row for each downtime reason
-                    for downtime in downtime_reasons:
-                        if isinstance(downtime, dict):
-                            downtime_details.append({
-                                "Report ID": report_id,
-                                "Date": date_str,
-                                "Factory": factory_name,
-                                "Downtime Reason": downtime.get("reason", "Unknown"),
-                                "Hours": downtime.get("hours", 0),
-                                "Created By": log.get("created_by", "Unknown")
-                            })
-                else:
-                    # Add row even if no specific reasons, but has downtime hours
-                    total_downtime = log.get("downtime_hours", 0)
-                    if total_downtime > 0:
-                        downtime_details.append({
-                            "Report ID": report_id,
-                            "Date": date_str,
-                            "Factory": factory_name,
-                            "Downtime Reason": "Not specified",
-                            "Hours": total_downtime,
-                            "Created By": log.get("created_by", "Unknown")
-                        })
+            summary_df.drop(columns=HIDDEN_COLUMNS).to_excel(writer, sheet_name=SUMMARY, index=False)
             
-            if downtime_details:
-                downtime_df = pd.DataFrame(downtime_details)
-                downtime_df.to_excel(writer, sheet_name='Downtime Details', index=False)
+            # Sheets 2-5: Production, Sales, Stock and Downtime details
+            for sheet_name in DETAIL_SHEETS:
+                detail_df = sheets[sheet_name]
+                if not detail_df.empty:
+                    detail_df.drop(columns=HIDDEN_COLUMNS).to_excel(writer, sheet_name=sheet_name, index=False)
             
             # Sheet 6: Overall Statistics
-            stats_data = []
-            
-            # Calculate overall statistics
-            total_reports = len(logs)
-            unique_factories = len(set(log.get("factory_id") for log in logs))
-            date_range_start = min(log.get("date") for log in logs if log.get("date")).strftime("%Y-%m-%d") if logs else "N/A"
-            date_range_end = max(log.get("date") for log in logs if log.get("date")).strftime("%Y-%m-%d") if logs else "N/A"
-            
-            # Production stats
-            total_production = sum(sum(log.get("production_data", {}).values()) for log in logs)
-            total_sales_qty = sum(
-                sum(item.get("amount", 0) if isinstance(item, dict) else 0 for item in log.get("sales_data", {}).values()) 
-                for log in logs
-            )
-            total_revenue = sum(
-                sum((item.get("amount", 0) * item.get("unit_price", 0)) if isinstance(item, dict) else 0 
-                    for item in log.get("sales_data", {}).values()) 
-                for log in logs
-            )
-            total_downtime = sum(log.get("downtime_hours", 0) for log in logs)
-            
-            stats_data = [
-                {"Metric": "Total Reports", "Value": total_reports},
-                {"Metric": "Unique Factories", "Value": unique_factories},
-                {"Metric": "Date Range Start", "Value": date_range_start},
-                {"Metric": "Date Range End", "Value": date_range_end},
-                {"Metric": "Total Production", "Value": total_production},
-                {"Metric": "Total Sales Quantity", "Value": total_sales_qty},
-                {"Metric": "Total Revenue", "Value": f"{total_revenue:.2f}"},
-                {"Metric": "Total Downtime Hours", "Value": total_downtime},
-            ]
-            
-            # Add factory-wise statistics
-            factory_stats = {}
-            for log in logs:
-                factory_id = log.get("factory_id")
-                if factory_id not in factory_stats:
-                    factory_stats[factory_id] = {
-                        "production": 0,
-                        "sales": 0,
-                        "revenue": 0,
-                        "downtime": 0,
-                        "reports": 0
-                    }
-                
-                factory_stats[factory_id]["production"] += sum(log.get("production_data", {}).values())
-                factory_stats[factory_id]["sales"] += sum(
-                    item.get("amount", 0) if isinstance(item, dict) else 0 
-                    for item in log.get("sales_data", {}).values()
-                )
-                factory_stats[factory_id]["revenue"] += sum(
-                    (item.get("amount", 0) * item.get("unit_price", 0)) if isinstance(item, dict) else 0
-                    for item in log.get("sales_data", {}).values()
-                )
-                factory_stats[factory_id]["downtime"] += log.get("downtime_hours", 0)
-                factory_stats[factory_id]["reports"] += 1
-            
-            # Add factory statistics to stats data
-            for factory_id, stats in factory_stats.items():
-                factory_name = FACTORIES.get(factory_id, {}).get("name", factory_id)
-                stats_data.extend([
-                    {"Metric": f"{factory_name} - Reports", "Value": stats["reports"]},
-                    {"Metric": f"{factory_name} - Production", "Value": stats["production"]},
-                    {"Metric": f"{factory_name} - Sales", "Value": stats["sales"]},
-                    {"Metric": f"{factory_name} - Revenue", "Value": f"{stats['revenue']:.2f}"},
-                    {"Metric": f"{factory_name} - Downtime Hours", "Value": stats["downtime"]},
-                ])
-            
-            stats_df = pd.DataFrame(stats_data)
             stats_df.to_excel(writer, sheet_name='Statistics', index=False)
         
         # Get the Excel content as bytes
@@ -826,27 +1032,12 @@ async def export_excel(
         excel_content = output.read()
         
         logger.info(f"Detailed Excel file size: {len(excel_content)} bytes")
-        logger.info(f"Successfully processed {len(logs)} logs with detailed product data")
+        logger.info(f"Successfully processed {len(summary_df)} logs with detailed product data")
         
         if len(excel_content) == 0:
             raise HTTPException(status_code=500, detail="Generated Excel file is empty")
         
-        # Create filename
-        filename = f"factory_detailed_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        logger.info(f"Sending detailed Excel file: {filename}")
-        
-        # Return as direct Response
-        return Response(
-            content=excel_content,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Length": str(len(excel_content)),
-                "Cache-Control": "no-cache, no-store, must-revalidate",
-                "Pragma": "no-cache",
-                "Expires": "0"
-            }
-        )
+        return excel_content
         
     except HTTPException as he:
         logger.error(f"HTTP Exception in export: {he.detail}")
@@ -857,22 +1048,68 @@ async def export_excel(
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+# Readiness probe, unauthenticated so load balancers can call it
+@api_router.get("/system/ready")
+async def get_readiness(response: Response):
+    if not readiness.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return readiness.status()
+
+
+# System endpoints (headquarters only)
+
+@api_router.get("/system/admission")
+async def get_admission_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "headquarters":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return admission_stats()
+
+
+@api_router.get("/system/coalescing")
+async def get_coalescing_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "headquarters":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return {analytics_flight.name: analytics_flight.stats()}
+
+
+@api_router.get("/system/export-cache")
+async def get_export_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "headquarters":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return {**export_cache.stats(), "fragments": fragment_cache.stats()}
+
+
+@api_router.delete("/system/export-cache")
+async def clear_export_cache(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "headquarters":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    export_cache.clear()
+    return {"message": "Export cache cleared"}
+
 # User management endpoints (headquarters only)
 @api_router.get("/users")
-async def get_users(current_user: dict = Depends(get_current_user)):
+async def get_users(
+    search: Optional[str] = None,
+    role: Optional[str] = None,
+    factory_id: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != "headquarters":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    users = await db.users.find({}).to_list(length=None)
-    
-    # Convert ObjectId to string and remove password hash
-    user_responses = []
-    for user in users:
-        user["_id"] = str(user["_id"])
-        user.pop("password_hash", None)  # Remove password hash for security
-        user_responses.append(UserResponse(**user))
+    # Projection keeps password hashes out of the query results entirely
+    query = directory_query(role, factory_id, search)
+    cursor = db.users.find(query, USER_PROJECTION).sort("username", 1).skip(offset).limit(limit)
+    users = await cursor.to_list(length=limit)
+    total = await db.users.count_documents(query)
     
-    return user_responses
+    return {"users": users, "total": total, "offset": offset, "limit": limit}
 
 @api_router.post("/users")
 async def create_user(user_data: UserCreate, current_user: dict = Depends(get_current_user)):
@@ -895,7 +1132,8 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(get_cu
         last_name=user_data.last_name
     )
     
-    result = await db.users.insert_one(user.dict())
+    user_document = {**user.dict(), "search_keys": search_keys(user.username, user.first_name, user.last_name)}
+    result = await db.users.insert_one(user_document)
     if result.inserted_id:
         return {"message": "User created successfully", "user_id": user.id}
     else:
@@ -936,6 +1174,7 @@ async def update_user(user_id: str, user_update: UserUpdate, current_user: dict
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update")
     
+    update_data.update(search_keys_update(user, update_data))
     result = await db.users.update_one({"id": user_id}, {"$set": update_data})
     if result.modified_count > 0:
         return {"message": "User updated successfully"}
@@ -960,34 +1199,113 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
 # Include the API router with the /api prefix
 app.include_router(api_router)
 
-# Create default admin user on startup
-@app.on_event("startup")
-async def create_admin_user():
-    # Remove existing admin user if exists
-    await db.users.delete_many({"username": "admin"})
-    
-    # Create new admin user with updated password
-    admin_data = {
-        "username": "admin",
-        "email": "admin@factory.com", 
-        "password": "admin1234",
-        "role": "headquarters",
-        "first_name": "Admin",
-        "last_name": "User"
-    }
+# Default admin account, created on first start and reset only when these settings change
+ADMIN_USER = {
+    "username": "admin",
+    "email": "admin@factory.com",
+    "role": "headquarters",
+    "first_name": "Admin",
+    "last_name": "User"
+}
+ADMIN_PASSWORD = "admin1234"
+
+# Indexes behind the daily log and user lookups; create_index is a no-op when they exist
+INDEXES = {
+    "daily_logs": [[("factory_id", 1), ("date", -1)], [("date", -1)], [("id", 1)]],
+    "users": USER_INDEXES,
+}
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", 2))
+
+
+async def ensure_indexes():
+    # Users created before search_keys existed would be invisible to directory search
+    await backfill_search_keys(db.users)
     
-    admin_user = User(
-        username=admin_data["username"],
-        email=admin_data["email"],
-        password_hash=hash_password(admin_data["password"]),
-        role=admin_data["role"],
-        first_name=admin_data["first_name"],
-        last_name=admin_data["last_name"]
-    )
+    for collection, index_keys in INDEXES.items():
+        for keys in index_keys:
+            await db[collection].create_index(keys)
+
+
+async def ensure_admin_user():
+    """Upsert the default admin, only when the account is missing or its bootstrap settings changed"""
+    # Keyed digest of the bootstrap settings, not of the stored profile: edits made through
+    # the API (email, name, password) survive a restart, and unchanged settings need no bcrypt work
+    config = json.dumps(ADMIN_USER, sort_keys=True) + ADMIN_PASSWORD
+    digest = hmac.new(SECRET_KEY.encode(), config.encode(), hashlib.sha256).hexdigest()
+    admins = await db.users.find({"username": ADMIN_USER["username"]}).to_list(length=None)
     
-    await db.users.insert_one(admin_user.dict())
+    if len(admins) == 1:
+        if admins[0].get("bootstrap_digest") == digest:
+            logger.info("Admin user up to date")
+            return
+    elif len(admins) > 1:
+        # Older versions could leave duplicates behind; keep the first one
+        await db.users.delete_many({"_id": {"$in": [admin["_id"] for admin in admins[1:]]}})
+    
+    password_hash = await asyncio.to_thread(hash_password, ADMIN_PASSWORD)
+    admin_user = User(**ADMIN_USER, password_hash=password_hash)
+    await db.users.update_one(
+        {"username": ADMIN_USER["username"]},
+        {
+            "$set": {
+                **ADMIN_USER,
+                "password_hash": password_hash,
+                "bootstrap_digest": digest,
+                "search_keys": search_keys(ADMIN_USER["username"], ADMIN_USER["first_name"], ADMIN_USER["last_name"]),
+            },
+            "$setOnInsert": {"id": admin_user.id, "created_at": admin_user.created_at},
+        },
+        upsert=True,
+    )
     logger.info("Admin user created/updated successfully")
 
+
+async def load_heavy_modules():
+    for module in HEAVY_MODULES:
+        await asyncio.to_thread(importlib.import_module, module)
+
+
+async def warm_up_step(name: str, step):
+    while True:
+        try:
+            await step()
+        except Exception as error:
+            readiness.fail(name, error)
+            logger.warning(f"Warm-up step {name} failed, retrying: {error}")
+            await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+        else:
+            readiness.mark(name)
+            return
+
+
+async def load_catalog():
+    await seed_catalog(db)
+    await factory_catalog.snapshot(db)
+
+
+async def warm_up():
+    """Bring the process to ready: Mongo reachable, indexes built, admin and catalog present, pandas loaded"""
+    async def database_steps():
+        await warm_up_step("mongo", lambda: client.admin.command("ping"))
+        await warm_up_step("indexes", ensure_indexes)
+        await warm_up_step("admin", ensure_admin_user)
+        await warm_up_step("catalog", load_catalog)
+    
+    await asyncio.gather(database_steps(), warm_up_step("analytics", load_heavy_modules))
+    logger.info(
+        f"Ready {readiness.ready_after:.2f}s after import started "
+        f"(module import took {readiness.imported_after:.2f}s)"
+    )
+
+
+# Warm up in the background so the process accepts connections (and liveness probes) at once
+@app.on_event("startup")
+async def start_warm_up():
+    app.state.warm_up = asyncio.create_task(warm_up())
+
+
+readiness.imported()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
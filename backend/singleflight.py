@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Share one in-progress computation between concurrent callers with the same key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._calls = 0
+        self._executions = 0
+        self._coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() unless an identical call is already running, in which case join it"""
+        self._calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self._executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._coalesced += 1
+
+        # Shield so one disconnecting caller does not cancel the work shared with the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self._calls,
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+        }
+
+
+def user_scope(current_user: dict) -> tuple:
+    """Key component describing which data a user is allowed to see"""
+    if current_user["role"] == "factory_employer":
+        return ("factory", current_user.get("factory_id"))
+    return ("all",)
+
+
+analytics_flight = SingleFlight("analytics")
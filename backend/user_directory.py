@@ -0,0 +1,65 @@
+"""Paginated, searchable user directory.
+
+Every user document carries search_keys: the lowercased username, first name, last name
+and full name. Prefix search is an anchored, case-sensitive regex on that multikey
+array, so it runs as an index range scan instead of a collection scan. Listings project
+only the public profile fields, so password hashes are never read.
+"""
+import re
+from typing import List, Optional
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+PUBLIC_FIELDS = ["id", "username", "email", "role", "factory_id", "first_name", "last_name", "created_at"]
+USER_PROJECTION = {"_id": 0, **{field: 1 for field in PUBLIC_FIELDS}}
+
+USER_INDEXES = [
+    [("username", 1)],
+    [("id", 1)],
+    [("role", 1), ("username", 1)],
+    [("factory_id", 1), ("username", 1)],
+    [("search_keys", 1)],
+]
+
+
+def search_keys(username: str, first_name: Optional[str] = None, last_name: Optional[str] = None) -> List[str]:
+    names = [username, first_name or "", last_name or "", f"{first_name or ''} {last_name or ''}".strip()]
+    return sorted({name.strip().lower() for name in names if name and name.strip()})
+
+
+def search_keys_update(user: dict, update_data: dict) -> dict:
+    """search_keys to $set alongside a partial user update, or {} when no name changed"""
+    if not any(field in update_data for field in ("username", "first_name", "last_name")):
+        return {}
+    merged = {**user, **update_data}
+    return {"search_keys": search_keys(merged["username"], merged.get("first_name"), merged.get("last_name"))}
+
+
+def directory_query(role: Optional[str] = None, factory_id: Optional[str] = None,
+                    search: Optional[str] = None) -> dict:
+    query = {}
+    if role:
+        query["role"] = role
+    if factory_id:
+        query["factory_id"] = factory_id
+    if search and search.strip():
+        query["search_keys"] = {"$regex": f"^{re.escape(search.strip().lower())}"}
+    return query
+
+
+async def backfill_search_keys(users) -> int:
+    """Fill search_keys on users created before they existed; a no-op once every user has them"""
+    from pymongo import UpdateOne
+
+    fields = {"username": 1, "first_name": 1, "last_name": 1}
+    missing = await users.find({"search_keys": {"$exists": False}}, fields).to_list(length=None)
+    operations = [
+        UpdateOne({"_id": user["_id"]}, {"$set": {
+            "search_keys": search_keys(user["username"], user.get("first_name"), user.get("last_name")),
+        }})
+        for user in missing
+    ]
+    if operations:
+        await users.bulk_write(operations, ordered=False)
+    return len(operations)
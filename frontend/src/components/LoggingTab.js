@@ -539,12 +539,12 @@ const LoggingTab = () => {
                                                             <div>
                                                                 <span className="font-medium">Total Production:</span>
                                                                 <br />
-                                                                {Object.values(log.production_data).reduce((sum, val) => sum + val, 0)} {factory?.sku_unit || 'units'}
+                                                                {log.total_production ?? Object.values(log.production_data).reduce((sum, val) => sum + val, 0)} {factory?.sku_unit || 'units'}
                                                             </div>
                                                             <div>
                                                                 <span className="font-medium">Total Sales:</span>
                                                                 <br />
-                                                                {Object.values(log.sales_data).reduce((sum, item) => sum + (item.amount || 0), 0)} {factory?.sku_unit || 'units'}
+                                                                {log.total_sales ?? Object.values(log.sales_data).reduce((sum, item) => sum + (item.amount || 0), 0)} {factory?.sku_unit || 'units'}
                                                             </div>
                                                             <div>
                                                                 <span className="font-medium">Downtime:</span>
@@ -5,10 +5,16 @@ import toast from 'react-hot-toast';
 import { AuthContext } from '../context/AuthContext';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 const UserManagementTab = () => {
     const { user } = useContext(AuthContext);
     const [users, setUsers] = useState([]);
+    const [totalUsers, setTotalUsers] = useState(0);
+    const [search, setSearch] = useState('');
+    const [roleFilter, setRoleFilter] = useState('');
+    const [factoryFilter, setFactoryFilter] = useState('');
+    const [offset, setOffset] = useState(0);
     const [factories, setFactories] = useState({});
     const [loading, setLoading] = useState(true);
     const [form, setForm] = useState({
@@ -23,10 +29,15 @@ const UserManagementTab = () => {
     const [editingUserId, setEditingUserId] = useState(null);
 
     useEffect(() => {
-        fetchUsers();
         fetchFactories();
     }, []);
 
+    // Search, filters and paging run on the server; debounce typing in the search box
+    useEffect(() => {
+        const timer = setTimeout(fetchUsers, 300);
+        return () => clearTimeout(timer);
+    }, [search, roleFilter, factoryFilter, offset]);
+
     const fetchUsers = async () => {
         try {
             const token = localStorage.getItem('token');
@@ -35,8 +46,16 @@ const UserManagementTab = () => {
                     'Authorization': `Bearer ${token}`,
                     'Content-Type': 'application/json',
                 },
+                params: {
+                    search: search || undefined,
+                    role: roleFilter || undefined,
+                    factory_id: factoryFilter || undefined,
+                    offset,
+                    limit: PAGE_SIZE,
+                },
             });
-            setUsers(res.data);
+            setUsers(res.data.users);
+            setTotalUsers(res.data.total);
         } catch (err) {
             console.error('Error fetching users:', err);
             toast.error('Failed to load users');
@@ -131,9 +150,17 @@ const UserManagementTab = () => {
         });
     };
 
+    // Only an unfiltered total tells whether this is the last remaining user
+    const isLastUser = totalUsers <= 1 && !search && !roleFilter && !factoryFilter;
+
+    const updateFilter = (setter) => (e) => {
+        setter(e.target.value);
+        setOffset(0);
+    };
+
     const handleDelete = async (id) => {
         // Check if this is the last user
-        if (users.length <= 1) {
+        if (isLastUser) {
             toast.error('Cannot delete the last remaining user');
             return;
         }
@@ -273,6 +300,38 @@ const UserManagementTab = () => {
                     </div>
                 </form>
 
+                {/* Directory Filters */}
+                <div className="grid grid-cols-1 md:grid-cols-3 gap-4 mb-4">
+                    <input
+                        type="text"
+                        value={search}
+                        onChange={updateFilter(setSearch)}
+                        placeholder="Search username or name"
+                        className="w-full border border-gray-300 rounded px-3 py-2"
+                    />
+                    <select
+                        value={roleFilter}
+                        onChange={updateFilter(setRoleFilter)}
+                        className="w-full border border-gray-300 rounded px-3 py-2"
+                    >
+                        <option value="">All Roles</option>
+                        <option value="factory_employer">Factory Employer</option>
+                        <option value="headquarters">Headquarters</option>
+                    </select>
+                    <select
+                        value={factoryFilter}
+                        onChange={updateFilter(setFactoryFilter)}
+                        className="w-full border border-gray-300 rounded px-3 py-2"
+                    >
+                        <option value="">All Factories</option>
+                        {Object.entries(factories || {}).map(([id, f]) => (
+                            <option key={id} value={id}>
+                                {f.name}
+                            </option>
+                        ))}
+                    </select>
+                </div>
+
                 {/* User List */}
                 <div className="overflow-x-auto">
                     {loading ? (
@@ -324,11 +383,11 @@ const UserManagementTab = () => {
                                             </button>
                                             <button
                                                 onClick={() => handleDelete(u.id)}
-                                                disabled={users.length <= 1}
-                                                className={`text-sm ${users.length <= 1 
+                                                disabled={isLastUser}
+                                                className={`text-sm ${isLastUser 
                                                     ? 'text-gray-400 cursor-not-allowed' 
                                                     : 'text-red-600 hover:text-red-800'}`}
-                                                title={users.length <= 1 ? 'Cannot delete the last remaining user' : 'Delete user'}
+                                                title={isLastUser ? 'Cannot delete the last remaining user' : 'Delete user'}
                                             >
                                                 Delete
                                             </button>
@@ -339,6 +398,31 @@ const UserManagementTab = () => {
                         </table>
                     )}
                 </div>
+
+                {/* Pagination */}
+                {totalUsers > PAGE_SIZE && (
+                    <div className="flex items-center justify-between mt-4 text-sm text-gray-600">
+                        <span>
+                            {offset + 1}-{Math.min(offset + PAGE_SIZE, totalUsers)} of {totalUsers} users
+                        </span>
+                        <div className="space-x-2">
+                            <button
+                                onClick={() => setOffset(Math.max(0, offset - PAGE_SIZE))}
+                                disabled={offset === 0}
+                                className="px-3 py-1 border border-gray-300 rounded disabled:opacity-50"
+                            >
+                                Previous
+                            </button>
+                            <button
+                                onClick={() => setOffset(offset + PAGE_SIZE)}
+                                disabled={offset + PAGE_SIZE >= totalUsers}
+                                className="px-3 py-1 border border-gray-300 rounded disabled:opacity-50"
+                            >
+                                Next
+                            </button>
+                        </div>
+                    </div>
+                )}
             </div>
         </div>
     );
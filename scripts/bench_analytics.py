@@ -0,0 +1,161 @@
+"""Micro-benchmarks: vectorized analytics kernel vs. the per-dict Python loops it replaced.
+
+Usage (from the repository root):
+    python scripts/bench_analytics.py --logs 20000 --repeat 5
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from analytics import PRODUCTION, SALES, build_frames, daily_product_series, factory_totals, to_native  # noqa: E402
+
+FACTORY_PRODUCTS = {
+    "amen_water": ["360ml", "600ml", "1000ml", "2000ml"],
+    "mintu_plast": [f"Preform {size}g" for size in range(10)],
+    "mintu_export": ["Sesame", "Niger", "Chickpea", "Red Bean"],
+    "wakene_food": ["Flour", "Fruska (Wheat Bran)", "Fruskelo (Wheat Germ)"],
+}
+
+
+def make_logs(count, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    factories = list(FACTORY_PRODUCTS)
+    logs = []
+    for index in range(count):
+        factory_id = factories[index % len(factories)]
+        products = FACTORY_PRODUCTS[factory_id]
+        logs.append({
+            "report_id": f"RPT-{10000 + index:05d}",
+            "date": start + timedelta(days=index // len(factories)),
+            "factory_id": factory_id,
+            "production_data": {product: rng.randint(0, 1000) for product in products},
+            "sales_data": {
+                product: {"amount": rng.randint(0, 800), "unit_price": round(rng.uniform(1, 50), 2)}
+                for product in products
+            },
+            "stock_data": {product: rng.randint(0, 5000) for product in products},
+            "downtime_hours": rng.choice([0, 0, 0.5, 2]),
+            "created_by": "bench",
+        })
+    return logs
+
+
+# Baseline: the per-log loops previously used by the endpoints
+def legacy_totals(log):
+    production_data = log.get("production_data", {})
+    sales_data = log.get("sales_data", {})
+    total_production = sum(production_data.values()) if production_data else 0
+    total_sales = sum(
+        item.get("amount", 0) if isinstance(item, dict) else 0
+        for item in sales_data.values()
+    ) if sales_data else 0
+    total_revenue = sum(
+        (item.get("amount", 0) * item.get("unit_price", 0)) if isinstance(item, dict) else 0
+        for item in sales_data.values()
+    ) if sales_data else 0
+    return total_production, total_sales, total_revenue
+
+
+def legacy_export_aggregates(logs):
+    summary_rows = [legacy_totals(log) for log in logs]
+    total_stock = sum(sum(log.get("stock_data", {}).values()) for log in logs)
+    factory_stats = {}
+    for log in logs:
+        stats = factory_stats.setdefault(
+            log.get("factory_id"), {"production": 0, "sales": 0, "revenue": 0, "downtime": 0, "reports": 0}
+        )
+        production, sales, revenue = legacy_totals(log)
+        stats["production"] += production
+        stats["sales"] += sales
+        stats["revenue"] += revenue
+        stats["downtime"] += log.get("downtime_hours", 0)
+        stats["reports"] += 1
+    return summary_rows, total_stock, factory_stats
+
+
+def legacy_trends(logs, dates):
+    result = {}
+    for factory_id, products in FACTORY_PRODUCTS.items():
+        factory_logs = [log for log in logs if log["factory_id"] == factory_id]
+        production_by_product = {product: [] for product in products}
+        sales_by_product = {product: [] for product in products}
+        for date_str in dates:
+            day = datetime.fromisoformat(date_str).date()
+            day_logs = [log for log in factory_logs if log["date"].date() == day]
+            for product in products:
+                production_by_product[product].append(
+                    sum(log["production_data"].get(product, 0) for log in day_logs)
+                )
+                sales_by_product[product].append(
+                    sum(log["sales_data"][product].get("amount", 0) for log in day_logs if product in log["sales_data"])
+                )
+        result[factory_id] = (production_by_product, sales_by_product)
+    return result
+
+
+def vectorized_export_aggregates(logs):
+    log_frame, _ = build_frames(logs)
+    return log_frame[["production", "sales", "revenue", "stock"]], factory_totals(log_frame)
+
+
+def vectorized_trends(logs, dates):
+    _, item_frame = build_frames(logs)
+    return {
+        factory_id: (
+            daily_product_series(item_frame, factory_id, PRODUCTION, products, dates),
+            daily_product_series(item_frame, factory_id, SALES, products, dates),
+        )
+        for factory_id, products in FACTORY_PRODUCTS.items()
+    }
+
+
+def trends_as_lists(vectorized):
+    """The kernel's trends in the legacy shape, as the endpoint serializes them"""
+    return {
+        factory_id: tuple(
+            {product: to_native(series[product]) for product in series.columns} for series in matrices
+        )
+        for factory_id, matrices in vectorized.items()
+    }
+
+
+def bench(label, fn, repeat):
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"  {label:<28} {best * 1000:10.2f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logs = make_logs(args.logs)
+    first, last = logs[0]["date"], logs[-1]["date"]
+    dates = [(first + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range((last - first).days + 1)]
+    print(f"{len(logs)} logs over {len(dates)} days")
+
+    print("export aggregates (summary rows and per-factory statistics)")
+    legacy = bench("per-dict loops", lambda: legacy_export_aggregates(logs), args.repeat)
+    vectorized = bench("vectorized kernel", lambda: vectorized_export_aggregates(logs), args.repeat)
+    print(f"  speedup: {legacy / vectorized:.1f}x")
+
+    print("daily per-product trends")
+    # Compared as JSON, so 3.0 where the loops produce 3 counts as a difference
+    if json.dumps(trends_as_lists(vectorized_trends(logs, dates))) != json.dumps(legacy_trends(logs, dates)):
+        sys.exit("vectorized trends differ from the per-dict loops")
+    legacy = bench("per-dict loops", lambda: legacy_trends(logs, dates), args.repeat)
+    vectorized = bench("vectorized kernel", lambda: vectorized_trends(logs, dates), args.repeat)
+    print(f"  speedup: {legacy / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
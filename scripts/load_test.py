@@ -0,0 +1,482 @@
+"""Load generator with a scripted factory-shift traffic model.
+
+Factory employers log in, check their own logs and post one daily log per shift. HQ
+users log in and poll the dashboard (summary, trends and factory comparison at once,
+like the dashboard page), and now and then export the last month to Excel. Every virtual
+user waits an exponentially distributed think time between actions.
+
+Load can be applied in steps, with --steps multiplying the user mix. Each step reports
+throughput, latency percentiles and error rates per endpoint, plus server CPU, RSS,
+event-loop lag and admission queue depth, so the saturation point shows up as the step
+where throughput stops growing and latency climbs.
+
+By default the backend runs in-process (ASGI, no network) against a dedicated database
+on a local MongoDB. Users and --history-days of logs are seeded directly; --reset drops
+the database first. Use --base-url to drive a running server instead. Point it at the
+same --mongo-url/--db-name for seeding, and pass --server-pid to sample its resources.
+
+Usage (from the repository root):
+    python scripts/load_test.py --mix employer=40,hq=5 --duration 60
+    python scripts/load_test.py --mix employer=20,hq=4 --steps 1,2,4,8 --duration 30 --json load.json
+    python scripts/load_test.py --base-url http://localhost:8001 --server-pid 1234 --db-name factory_db
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+PASSWORD = "loadtest"
+USER_KINDS = ["employer", "hq"]
+PERCENTILES = [50, 90, 95, 99]
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        kind, _, count = part.partition("=")
+        if kind.strip() not in USER_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown user kind {kind!r}; expected one of {USER_KINDS}")
+        mix[kind.strip()] = int(count)
+    return mix
+
+
+class Stats:
+    """Request outcomes per (step, endpoint)"""
+
+    def __init__(self):
+        self.step = 0
+        self.latencies: Dict[tuple, List[float]] = {}
+        self.errors: Dict[tuple, int] = {}
+        self.rejected: Dict[tuple, int] = {}
+
+    def record(self, endpoint: str, latency: float, status_code: Optional[int]):
+        key = (self.step, endpoint)
+        self.latencies.setdefault(key, []).append(latency)
+        if status_code is None or status_code >= 400:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        if status_code == 429:
+            self.rejected[key] = self.rejected.get(key, 0) + 1
+
+    def summary(self, step: int, duration: float) -> dict:
+        endpoints = {}
+        all_latencies = []
+        for (key_step, endpoint), latencies in sorted(self.latencies.items()):
+            if key_step != step:
+                continue
+            all_latencies.extend(latencies)
+            endpoints[endpoint] = self._describe(
+                latencies, self.errors.get((step, endpoint), 0), self.rejected.get((step, endpoint), 0), duration
+            )
+        errors = sum(count for (key_step, _), count in self.errors.items() if key_step == step)
+        rejected = sum(count for (key_step, _), count in self.rejected.items() if key_step == step)
+        return {**self._describe(all_latencies, errors, rejected, duration), "endpoints": endpoints}
+
+    @staticmethod
+    def _describe(latencies: List[float], errors: int, rejected: int, duration: float) -> dict:
+        values = np.asarray(latencies) * 1000
+        return {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            "rejected_429": rejected,
+            "latency_ms": {
+                **{f"p{p}": round(float(np.percentile(values, p)), 1) for p in PERCENTILES},
+                "max": round(float(values.max()), 1),
+            } if len(values) else {},
+        }
+
+
+class ResourceSampler:
+    """Periodic CPU, RSS, event-loop lag and admission samples of the server process"""
+
+    def __init__(self, pid: Optional[int], in_process, interval: float = 1.0):
+        self.pid = pid
+        self.in_process = in_process  # the imported server module, or None for --base-url
+        self.interval = interval
+        self.samples: List[dict] = []
+
+    def _cpu_seconds(self) -> Optional[float]:
+        if self.pid is None:
+            if not self.in_process:
+                return None  # remote server without --server-pid: nothing to measure
+            times = os.times()
+            return times.user + times.system
+        try:
+            fields = Path(f"/proc/{self.pid}/stat").read_text().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _rss_mb(self) -> Optional[float]:
+        pid = self.pid or (os.getpid() if self.in_process else None)
+        if pid is None:
+            return None
+        try:
+            pages = int(Path(f"/proc/{pid}/statm").read_text().split()[1])
+            return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+        except (OSError, IndexError, ValueError):
+            return None
+
+    async def run(self, stats: Stats, stop: asyncio.Event):
+        last_wall, last_cpu = time.perf_counter(), self._cpu_seconds()
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            cpu = self._cpu_seconds()
+            cpu_percent = None
+            if cpu is not None and last_cpu is not None:
+                cpu_percent = round(100 * (cpu - last_cpu) / (now - last_wall), 1)
+            sample = {
+                "step": stats.step,
+                "cpu_percent": cpu_percent,
+                "rss_mb": self._rss_mb(),
+                # Only meaningful in-process, where the server shares this event loop
+                "loop_lag_ms": round((now - started - self.interval) * 1000, 1) if self.in_process else None,
+            }
+            if self.in_process:
+                sample["admission_queue"] = sum(
+                    limiter["queue_depth"] for limiter in self.in_process.admission_stats().values()
+                )
+            self.samples.append(sample)
+            last_wall, last_cpu = now, cpu
+
+    def summary(self, step: int) -> dict:
+        samples = [sample for sample in self.samples if sample["step"] == step]
+        result = {}
+        for field in ("cpu_percent", "rss_mb", "loop_lag_ms", "admission_queue"):
+            values = [sample[field] for sample in samples if sample.get(field) is not None]
+            if values:
+                result[f"{field}_avg"] = round(sum(values) / len(values), 1)
+                result[f"{field}_max"] = max(values)
+        return result
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, username: str, think_time: float,
+                 rng: random.Random):
+        self.client = client
+        self.stats = stats
+        self.username = username
+        self.think_time = think_time
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(endpoint, time.perf_counter() - started, None)
+            return None
+        self.stats.record(endpoint, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def think(self, stop: asyncio.Event):
+        try:
+            await asyncio.wait_for(stop.wait(), self.rng.expovariate(1 / self.think_time))
+        except asyncio.TimeoutError:
+            pass
+
+    async def login(self, stop: asyncio.Event) -> bool:
+        while not stop.is_set():
+            response = await self.call("POST /auth/login", "POST", "/api/auth/login",
+                                       json={"username": self.username, "password": PASSWORD})
+            if response is not None and response.status_code == 200:
+                self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+                return True
+            await self.think(stop)
+        return False
+
+
+class Employer(VirtualUser):
+    """Factory shift: check own logs, then post the next day's log"""
+
+    def __init__(self, *args, factory_id: str, products: List[str], next_date, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factory_id = factory_id
+        self.products = products
+        self.next_date = next_date
+
+    def daily_log(self) -> dict:
+        rng = self.rng
+        return {
+            "date": self.next_date(self.factory_id).isoformat(),
+            "factory_id": self.factory_id,
+            "production_data": {product: rng.randint(0, 1000) for product in self.products},
+            "sales_data": {
+                product: {"amount": rng.randint(0, 800), "unit_price": round(rng.uniform(1, 50), 2)}
+                for product in self.products if rng.random() < 0.8
+            },
+            "downtime_hours": rng.choice([0, 0, 0, 0.5, 2]),
+            "downtime_reasons": [],
+            "stock_data": {product: rng.randint(0, 5000) for product in self.products if rng.random() < 0.5},
+        }
+
+    async def run(self, stop: asyncio.Event):
+        if not await self.login(stop):
+            return
+        while not stop.is_set():
+            await self.call("GET /daily-logs", "GET", "/api/daily-logs", params={"created_by_me": "true"})
+            await self.think(stop)
+            if stop.is_set():
+                break
+            await self.call("POST /daily-logs", "POST", "/api/daily-logs", json=self.daily_log())
+            await self.think(stop)
+
+
+class Headquarters(VirtualUser):
+    """HQ dashboard polling with occasional Excel exports"""
+
+    def __init__(self, *args, export_probability: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.export_probability = export_probability
+
+    async def run(self, stop: asyncio.Event):
+        if not await self.login(stop):
+            return
+        while not stop.is_set():
+            # The dashboard page fires its three requests together
+            await asyncio.gather(
+                self.call("GET /dashboard-summary", "GET", "/api/dashboard-summary"),
+                self.call("GET /analytics/trends", "GET", "/api/analytics/trends", params={"days": 30}),
+                self.call("GET /analytics/factory-comparison", "GET", "/api/analytics/factory-comparison"),
+            )
+            if self.rng.random() < self.export_probability:
+                start_date = (datetime.utcnow() - timedelta(days=30)).date().isoformat()
+                await self.call("GET /export-excel", "GET", "/api/export-excel", params={"start_date": start_date})
+            await self.think(stop)
+
+
+def seed(db, factories: Dict[str, dict], mix: Dict[str, int], max_multiplier: int, history_days: int,
+         seed_value: int) -> Dict[str, List[str]]:
+    """Create load-test users and historical logs directly in MongoDB"""
+    from line_items import storage_document
+    from log_totals import totals_for
+    from passlib.context import CryptContext
+    from user_directory import search_keys
+
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD)
+    usernames = {"employer": [], "hq": []}
+    users = []
+    for index in range(mix.get("employer", 0) * max_multiplier):
+        factory_id = list(factories)[index % len(factories)]
+        usernames["employer"].append((f"lt_{factory_id}_{index}", factory_id))
+    for index in range(mix.get("hq", 0) * max_multiplier):
+        usernames["hq"].append((f"lt_hq_{index}", None))
+    for kind, entries in usernames.items():
+        for username, factory_id in entries:
+            users.append({
+                "id": username,
+                "username": username,
+                "email": f"{username}@loadtest.local",
+                "password_hash": password_hash,
+                "role": "factory_employer" if kind == "employer" else "headquarters",
+                "factory_id": factory_id,
+                "first_name": "Load",
+                "last_name": "Test",
+                "created_at": datetime.utcnow(),
+                "search_keys": search_keys(username, "Load", "Test"),
+            })
+    db.users.delete_many({"username": {"$regex": "^lt_"}})
+    if users:
+        db.users.insert_many(users)
+
+    rng = random.Random(seed_value)
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    logs = []
+    existing = db.daily_logs.count_documents({"created_by": "lt_seed"})
+    if not existing:
+        for offset in range(1, history_days + 1):
+            for factory_id, config in factories.items():
+                log = {
+                    "id": f"lt-{factory_id}-{offset}",
+                    "report_id": f"RPT-LT{offset:05d}{list(factories).index(factory_id)}",
+                    "date": today - timedelta(days=offset),
+                    "factory_id": factory_id,
+                    "production_data": {product: rng.randint(0, 1000) for product in config["products"]},
+                    "sales_data": {
+                        product: {"amount": rng.randint(0, 800), "unit_price": round(rng.uniform(1, 50), 2)}
+                        for product in config["products"]
+                    },
+                    "downtime_hours": rng.choice([0, 0, 0, 0.5, 2]),
+                    "downtime_reasons": [],
+                    "stock_data": {product: rng.randint(0, 5000) for product in config["products"]},
+                    "created_by": "lt_seed",
+                    "created_at": datetime.utcnow(),
+                }
+                log.update(totals_for(log))
+                logs.append(storage_document(log))
+        if logs:
+            db.daily_logs.insert_many(logs)
+    return usernames
+
+
+def date_allocator(db, factories: Dict[str, dict]):
+    """Unique future dates per factory, so posted logs never hit the one-per-day rule"""
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    latest = {}
+    for factory_id in factories:
+        last = db.daily_logs.find_one({"factory_id": factory_id}, sort=[("date", -1)])
+        latest[factory_id] = max(today, last["date"]) if last else today
+
+    def next_date(factory_id: str) -> datetime:
+        latest[factory_id] += timedelta(days=1)
+        return latest[factory_id]
+    return next_date
+
+
+def print_step(step: dict):
+    print(
+        f"\nstep x{step['multiplier']}: {step['users']} users, {step['requests']} requests, "
+        f"{step['throughput_rps']} req/s, errors {step['error_rate']:.2%}, 429s {step['rejected_429']}"
+    )
+    if step["resources"]:
+        print("  server: " + ", ".join(f"{key}={value}" for key, value in step["resources"].items()))
+    print(f"  {'endpoint':<34}{'reqs':>7}{'rps':>8}{'err%':>7}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES)
+          + f"{'max':>9}")
+    for endpoint, row in step["endpoints"].items():
+        latency = row["latency_ms"]
+        print(
+            f"  {endpoint:<34}{row['requests']:>7}{row['throughput_rps']:>8}{row['error_rate'] * 100:>7.1f}"
+            + "".join(f"{latency.get(f'p{p}', 0):>9}" for p in PERCENTILES) + f"{latency.get('max', 0):>9}"
+        )
+
+
+async def run(args) -> dict:
+    from pymongo import MongoClient
+
+    sync_db = MongoClient(args.mongo_url)[args.db_name]
+    if args.reset:
+        sync_db.client.drop_database(args.db_name)
+
+    server = None
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+    else:
+        os.environ["MONGO_URL"] = args.mongo_url
+        os.environ["DB_NAME"] = args.db_name
+        import server
+        transport = httpx.ASGITransport(app=server.app)
+        base_url = "http://loadtest"
+        await server.app.router.startup()
+        while not server.readiness.ready:
+            await asyncio.sleep(0.1)
+
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=timeout, limits=limits) as client:
+        factories = (await client.get("/api/factories")).json()
+        users = seed(sync_db, factories, args.mix, max(args.steps), args.history_days, args.seed)
+        next_date = date_allocator(sync_db, factories)
+        print(f"Seeded {sum(len(entries) for entries in users.values())} users and "
+              f"{args.history_days} days of history into {args.db_name}")
+
+        stats = Stats()
+        stop = asyncio.Event()
+        sampler = ResourceSampler(args.server_pid, server)
+        if server is None and args.server_pid is None:
+            print("No --server-pid given: server CPU and memory are not sampled")
+        sampler_task = asyncio.create_task(sampler.run(stats, stop))
+        rng = random.Random(args.seed)
+        tasks: List[asyncio.Task] = []
+        spawned = {kind: 0 for kind in USER_KINDS}
+        steps = []
+
+        for step_index, multiplier in enumerate(args.steps):
+            stats.step = step_index
+            target = {kind: args.mix.get(kind, 0) * multiplier for kind in USER_KINDS}
+            new_users = []
+            for kind in USER_KINDS:
+                for username, factory_id in users[kind][spawned[kind]:target[kind]]:
+                    user_rng = random.Random(rng.random())
+                    if kind == "employer":
+                        new_users.append(Employer(
+                            client, stats, username, args.think_time, user_rng,
+                            factory_id=factory_id, products=factories[factory_id]["products"], next_date=next_date,
+                        ))
+                    else:
+                        new_users.append(Headquarters(
+                            client, stats, username, args.think_time, user_rng,
+                            export_probability=args.export_probability,
+                        ))
+                spawned[kind] = max(spawned[kind], target[kind])
+
+            started = time.perf_counter()
+            for index, user in enumerate(new_users):
+                # Spread arrivals over the ramp-up instead of a thundering herd of logins
+                delay = args.ramp_up * index / max(1, len(new_users))
+                tasks.append(asyncio.create_task(_delayed(user.run(stop), delay, stop)))
+            await asyncio.sleep(args.duration)
+
+            step = {
+                "multiplier": multiplier,
+                "users": sum(spawned.values()),
+                **stats.summary(step_index, time.perf_counter() - started),
+                "resources": sampler.summary(step_index),
+            }
+            steps.append(step)
+            print_step(step)
+
+        stop.set()
+        await asyncio.gather(*tasks, sampler_task, return_exceptions=True)
+
+    if server is not None:
+        await server.app.router.shutdown()
+        print(f"\nServer import-to-ready: {server.readiness.ready_after:.2f}s")
+    return {"config": {key: value for key, value in vars(args).items()}, "steps": steps}
+
+
+async def _delayed(coroutine, delay: float, stop: asyncio.Event):
+    try:
+        await asyncio.wait_for(stop.wait(), delay)
+        coroutine.close()
+        return
+    except asyncio.TimeoutError:
+        pass
+    await coroutine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("employer=20,hq=4"),
+                        help="virtual users per kind, e.g. employer=40,hq=5")
+    parser.add_argument("--steps", type=lambda text: [int(part) for part in text.split(",")], default=[1],
+                        help="comma-separated multipliers of the mix, one load step each")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per step")
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds over which a step's new users arrive")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between a user's actions")
+    parser.add_argument("--export-probability", type=float, default=0.05,
+                        help="chance an HQ dashboard poll is followed by an Excel export")
+    parser.add_argument("--history-days", type=int, default=180, help="days of seeded logs per factory")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="factory_loadtest")
+    parser.add_argument("--reset", action="store_true", help="drop --db-name before seeding")
+    parser.add_argument("--base-url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, help="pid of the --base-url server, for resource sampling")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, default=str))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
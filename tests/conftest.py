@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import mongomock
+import pytest
+
+# Backend modules import each other as siblings, as they do when server.py runs
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "factory_portal_test")
+os.environ.setdefault("EXPORT_CACHE_DIR", tempfile.mkdtemp(prefix="export_cache_"))
+
+
+class AsyncCursor:
+    """The slice of Motor's cursor API the backend uses, over a mongomock cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, count: int):
+        self._cursor = self._cursor.skip(count)
+        return self
+
+    def limit(self, count: int):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        documents = list(self._cursor)
+        return documents if length is None else documents[:length]
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.sync = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.sync.find(*args, **kwargs))
+
+    def aggregate(self, pipeline, **kwargs):
+        return AsyncCursor(self.sync.aggregate(pipeline, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.sync = mongomock.MongoClient().db
+
+    def __getitem__(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self.sync[name])
+
+    def __getattr__(self, name: str) -> AsyncCollection:
+        return self[name]
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    """An empty in-memory database behind server.db, with every server-side cache reset"""
+    import server
+    from archive import archive_catalog
+    from export_cache import ExportCache, FragmentCache
+
+    database = AsyncDatabase()
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "export_cache", ExportCache(tmp_path / "exports", 256 * 1024 * 1024))
+    monkeypatch.setattr(server, "fragment_cache", FragmentCache(600))
+    monkeypatch.setattr(server, "anomaly_blocks", FragmentCache(600))
+    archive_catalog.invalidate()
+    server.factory_catalog.invalidate()
+    return database
@@ -0,0 +1,45 @@
+import asyncio
+
+import server
+
+HQ_EDIT = server.UserUpdate(email="ops@factory.com", first_name="Operations")
+
+
+async def admin():
+    return await server.db.users.find_one({"username": server.ADMIN_USER["username"]})
+
+
+def test_restart_keeps_edits_made_through_the_api(db):
+    async def scenario():
+        await server.ensure_admin_user()
+        created = await admin()
+        await server.update_user(created["id"], HQ_EDIT, {"id": "someone-else", "role": "headquarters"})
+        edited = await admin()
+
+        await server.ensure_admin_user()
+        restarted = await admin()
+        assert restarted["email"] == "ops@factory.com"
+        assert restarted["first_name"] == "Operations"
+        assert restarted["password_hash"] == edited["password_hash"]
+        assert restarted["id"] == created["id"]
+
+    asyncio.run(scenario())
+
+
+def test_changed_bootstrap_settings_are_applied(db, monkeypatch):
+    async def scenario():
+        await server.ensure_admin_user()
+        created = await admin()
+
+        monkeypatch.setattr(server, "ADMIN_USER", {**server.ADMIN_USER, "email": "root@factory.com"})
+        await server.ensure_admin_user()
+        assert (await admin())["email"] == "root@factory.com"
+        assert (await admin())["password_hash"] != created["password_hash"]
+
+        monkeypatch.setattr(server, "ADMIN_PASSWORD", "rotated-password")
+        await server.ensure_admin_user()
+        assert server.verify_password("rotated-password", (await admin())["password_hash"])
+        assert (await admin())["id"] == created["id"]
+        assert await server.db.users.count_documents({}) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionLimiter
+
+
+def limiter(**overrides) -> AdmissionLimiter:
+    options = {"name": "test", "capacity": 2, "max_queue": 4, "per_user": 0, "queue_timeout": 1.0}
+    options.update(overrides)
+    return AdmissionLimiter(**options)
+
+
+async def hold(limiter: AdmissionLimiter, release: asyncio.Event, user=None, weight: int = 1):
+    async with limiter.slot(user, weight):
+        await release.wait()
+
+
+def test_admits_up_to_capacity_then_queues_in_order():
+    async def scenario():
+        gate = limiter()
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(gate, release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert gate.stats()["in_use"] == 2
+        assert gate.stats()["queue_depth"] == 1
+
+        release.set()
+        await asyncio.gather(*holders)
+        assert gate.stats()["in_use"] == 0
+        assert gate.stats()["admitted"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        gate = limiter(capacity=1, max_queue=1)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(gate, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.slot():
+                pass
+        assert rejected.value.status_code == 429
+        assert rejected.value.headers["Retry-After"] == str(gate.retry_after)
+        assert gate.stats()["rejected"] == 1
+
+        release.set()
+        await asyncio.gather(*holders)
+
+    asyncio.run(scenario())
+
+
+def test_per_user_cap_is_rejected_without_touching_others():
+    async def scenario():
+        gate = limiter(capacity=4, per_user=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(gate, release, user="alice"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.slot("alice"):
+                pass
+        assert rejected.value.status_code == 429
+        async with gate.slot("bob"):
+            assert gate.stats()["users_in_flight"] == 2
+
+        release.set()
+        await holder
+        assert gate.stats()["users_in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_timeout_rejects_and_frees_the_queue():
+    async def scenario():
+        gate = limiter(capacity=1, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(gate, release, user="alice"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.slot("bob"):
+                pass
+        assert rejected.value.status_code == 429
+        assert gate.stats()["queue_depth"] == 0
+        assert gate.stats()["users_in_flight"] == 1
+
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_head_wakes_smaller_waiters_that_fit():
+    async def scenario():
+        gate = limiter(capacity=2, queue_timeout=0.1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(gate, release))
+        await asyncio.sleep(0)
+
+        # The heavy request cannot fit beside the holder and blocks the light one behind it
+        heavy = asyncio.create_task(hold(gate, release, weight=2))
+        await asyncio.sleep(0.05)
+        light_admitted = asyncio.Event()
+
+        async def light():
+            async with gate.slot():
+                light_admitted.set()
+
+        light_task = asyncio.create_task(light())
+        with pytest.raises(HTTPException):
+            await heavy
+        await asyncio.wait_for(light_admitted.wait(), timeout=0.04)
+        await light_task
+
+        release.set()
+        await holder
+        assert gate.stats()["in_use"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_while_queued_leaves_no_trace_and_wakes_the_next_waiter():
+    async def scenario():
+        gate = limiter(capacity=2, queue_timeout=5.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(gate, release))
+        await asyncio.sleep(0)
+
+        heavy = asyncio.create_task(hold(gate, release, user="alice", weight=2))
+        await asyncio.sleep(0)
+        light_admitted = asyncio.Event()
+
+        async def light():
+            async with gate.slot():
+                light_admitted.set()
+
+        light_task = asyncio.create_task(light())
+        await asyncio.sleep(0)
+        assert gate.stats()["queue_depth"] == 2
+
+        heavy.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await heavy
+        await asyncio.wait_for(light_admitted.wait(), timeout=0.5)
+        await light_task
+        assert gate.stats()["queue_depth"] == 0
+        assert gate.stats()["users_in_flight"] == 0
+
+        release.set()
+        await holder
+        assert gate.stats()["in_use"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_granted_as_the_timeout_fires_is_given_back(monkeypatch):
+    gate = limiter(capacity=1)
+
+    async def granted_then_timed_out(future, timeout):
+        # The holder leaves and _wake() hands its slot to this waiter, then the timeout wins
+        gate._release(1)
+        assert future.done()
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        gate._in_use = 1
+        monkeypatch.setattr(asyncio, "wait_for", granted_then_timed_out)
+        with pytest.raises(HTTPException) as rejected:
+            async with gate.slot():
+                pass
+        monkeypatch.undo()
+        assert rejected.value.status_code == 429
+        assert gate.stats()["in_use"] == 0
+        async with gate.slot():
+            assert gate.stats()["in_use"] == 1
+
+    asyncio.run(scenario())
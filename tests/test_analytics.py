@@ -0,0 +1,62 @@
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import line_items
+import server
+from analytics import PRODUCTION, build_frames, daily_product_series, to_native
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from bench_analytics import legacy_trends, make_logs, trends_as_lists, vectorized_trends  # noqa: E402
+
+
+def sparse_logs():
+    """Benchmark logs with gaps: a factory without reports, missing days and missing products"""
+    logs = []
+    for index, log in enumerate(make_logs(400)):
+        if log["factory_id"] == "wakene_food" or index % 7 == 0:
+            continue
+        if index % 3 == 0:
+            log["production_data"] = dict(list(log["production_data"].items())[:1])
+            log["sales_data"] = {}
+        logs.append(log)
+    return logs
+
+
+def day_range(logs):
+    first = min(log["date"] for log in logs)
+    last = max(log["date"] for log in logs) + timedelta(days=2)
+    return [(first + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range((last - first).days + 1)]
+
+
+def test_trends_match_the_per_dict_loops_value_for_value():
+    logs = sparse_logs()
+    dates = day_range(logs)
+    # JSON keeps the distinction between 3 and 3.0
+    assert json.dumps(trends_as_lists(vectorized_trends(logs, dates))) == json.dumps(legacy_trends(logs, dates))
+
+
+def test_series_without_items_are_integer_zeros():
+    _, item_frame = build_frames([])
+    series = daily_product_series(item_frame, "amen_water", PRODUCTION, ["360ml"], ["2025-01-01", "2025-01-02"])
+    assert to_native(series["360ml"]) == [0, 0]
+    assert all(type(value) is int for value in to_native(series["360ml"]))
+
+
+def test_trends_stay_integers_with_the_line_item_layout(db, monkeypatch):
+    hq = {"username": "admin", "role": "headquarters"}
+    monkeypatch.setattr(line_items, "LOG_STORAGE_LAYOUT", line_items.LAYOUT_LINE_ITEMS)
+    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    async def scenario():
+        await server.create_daily_log(server.DailyLogCreate(
+            date=yesterday, factory_id="amen_water", production_data={"360ml": 3},
+        ), hq)
+        return await server.compute_analytics_trends(7, hq)
+
+    amen_water = asyncio.run(scenario())["factories"]["amen_water"]
+    assert sum(amen_water["production_by_product"]["360ml"]) == 3
+    assert all(type(value) is int for value in amen_water["production_by_product"]["360ml"])
+    assert all(type(value) is int for value in amen_water["production"])
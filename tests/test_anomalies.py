@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import server
+from anomalies import TOTAL, detect_anomalies, rolling_baseline
+
+HQ = {"username": "admin", "role": "headquarters"}
+
+
+def test_chunked_baseline_matches_a_single_pass():
+    rng = np.random.default_rng(7)
+    values = rng.normal(100, 10, (120, 9))
+    values[rng.random(values.shape) < 0.2] = np.nan
+
+    whole = rolling_baseline(values, 14, max_elements=10 ** 9)
+    chunked = rolling_baseline(values, 14, max_elements=120 * 14 * 2)  # two series per chunk
+    for expected, actual in zip(whole, chunked):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_spike_is_flagged_against_a_steady_baseline():
+    days = [f"2025-01-{day:02d}" for day in range(1, 31)]
+    values = np.tile([100.0, 101.0, 99.0], 10)
+    values[25] = 160.0
+    matrix = pd.DataFrame({("amen_water", "production", TOTAL): values}, index=days)
+
+    anomalies = detect_anomalies(matrix, window=14, threshold=3.5, start_day="2025-01-15")
+    assert [(anomaly["date"], anomaly["direction"]) for anomaly in anomalies] == [("2025-01-26", "high")]
+    assert anomalies[0]["product"] is None
+
+
+def test_production_spike_is_reported_by_the_endpoint(db):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    spike_day = today - timedelta(days=2)
+
+    async def scenario():
+        for offset in range(40, 0, -1):
+            day = today - timedelta(days=offset)
+            await server.create_daily_log(server.DailyLogCreate(
+                date=day.strftime("%Y-%m-%d"),
+                factory_id="amen_water",
+                production_data={"600ml": 2000 if day == spike_day else 400 + offset % 3},
+            ), HQ)
+        return await server.get_analytics_anomalies(
+            days=30, window=14, threshold=3.5, factory_id="amen_water", current_user=HQ
+        )
+
+    result = asyncio.run(scenario())
+    flagged = {(anomaly["date"], anomaly["metric"], anomaly["product"]) for anomaly in result["anomalies"]}
+    assert (spike_day.strftime("%Y-%m-%d"), "production", "600ml") in flagged
+    assert result["anomalies"][0]["factory_name"] == "Amen (Victory) Water"
+
+
+@pytest.mark.parametrize("user, factory_id", [
+    (HQ, "nope"),
+    ({"username": "worker", "role": "factory_employer", "factory_id": "closed_plant"}, None),
+])
+def test_unknown_factory_is_not_found(db, user, factory_id):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_analytics_anomalies(
+            days=30, window=14, threshold=3.5, factory_id=factory_id, current_user=user
+        ))
+    assert error.value.status_code == 404
@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import archive
+import server
+from archive import ROLLUP_COLLECTION, STATE_COLLECTION, STATE_ID, archive_catalog, archive_collection_name, run_archive
+from data_versions import database_epoch
+
+HQ = {"username": "admin", "role": "headquarters"}
+TODAY = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+# Old logs straddle a year boundary, so the run fills two partitions
+OLD_DAYS = [TODAY - timedelta(days=400 + 29 * n) for n in range(12)]
+NEW_DAYS = [TODAY - timedelta(days=30 * n) for n in range(1, 4)]
+
+
+def log_for(day: datetime, factory_id: str = "amen_water") -> server.DailyLogCreate:
+    quantity = 100 + day.timetuple().tm_yday
+    return server.DailyLogCreate(
+        date=day.strftime("%Y-%m-%d"),
+        factory_id=factory_id,
+        production_data={"360ml": quantity},
+        sales_data={"600ml": {"amount": quantity // 4, "unit_price": 2.5}},
+        downtime_hours=day.day % 3,
+    )
+
+
+async def seed(days=OLD_DAYS + NEW_DAYS):
+    for day in days:
+        await server.create_daily_log(log_for(day), HQ)
+
+
+def archive_now(db, **kwargs) -> int:
+    moved = run_archive(db.sync, 365, batch_size=kwargs.pop("batch_size", 5), routing_delay=kwargs.pop("routing_delay", 0))
+    archive_catalog.invalidate()
+    return moved
+
+
+def last_old_report(db) -> int:
+    logs = db.sync.daily_logs.find({"date": {"$lt": TODAY - timedelta(days=365)}})
+    return max(int(log["report_id"][4:]) for log in logs)
+
+
+def sorted_logs(logs):
+    return sorted((log["id"], log["date"], log["total_production"], log["total_revenue"]) for log in logs)
+
+
+async def reads(start_date=None, end_date=None):
+    query = server.build_query_filters(HQ, start_date, end_date, None)
+    totals = await server.load_factory_totals(query)
+    return sorted_logs(await server.find_daily_logs(query)), totals.to_dict("index")
+
+
+def test_run_moves_old_logs_and_leaves_reads_unchanged(db):
+    async def scenario():
+        await seed()
+        mid_range = (OLD_DAYS[3].strftime("%Y-%m-%d"), NEW_DAYS[1].strftime("%Y-%m-%d"))
+        before = [await reads(), await reads(*mid_range)]
+        max_report = last_old_report(db)
+
+        assert archive_now(db) == len(OLD_DAYS)
+        assert await db.daily_logs.count_documents({}) == len(NEW_DAYS)
+        years = sorted({day.year for day in OLD_DAYS})
+        assert len(years) == 2
+        for year in years:
+            partition = db[archive_collection_name(year)]
+            assert await partition.count_documents({}) == sum(day.year == year for day in OLD_DAYS)
+        # Each batch rebuilt its months, so all-time totals (hot logs plus rollups) are complete
+        assert await db[ROLLUP_COLLECTION].count_documents({}) == len({(day.year, day.month) for day in OLD_DAYS})
+
+        assert [await reads(), await reads(*mid_range)] == before
+        state = await db[STATE_COLLECTION].find_one({"_id": STATE_ID})
+        assert state["years"] == years
+        assert state["archived_before"] == TODAY - timedelta(days=365)
+        assert state["max_report_number"] == max_report
+        # Numbering continues after the archived reports even with the hot collection emptied
+        await db.daily_logs.delete_many({})
+        assert await server.get_next_report_id() == f"RPT-{max_report + 1:05d}"
+
+    asyncio.run(scenario())
+
+
+def test_reads_are_routed_to_overlapping_partitions(db):
+    async def scenario():
+        await seed()
+        archive_now(db)
+        first, second = sorted({day.year for day in OLD_DAYS})
+
+        def between(start=None, end=None):
+            return {"date": {key: value for key, value in (("$gte", start), ("$lte", end)) if value}}
+
+        assert await archive_catalog.archived_years(db, {}) == [first, second]
+        assert await archive_catalog.archived_years(db, between(datetime(second, 1, 1))) == [second]
+        assert await archive_catalog.archived_years(db, between(end=datetime(first, 12, 31))) == [first]
+        assert await archive_catalog.archived_years(db, between(TODAY - timedelta(days=10))) == []
+
+    asyncio.run(scenario())
+
+
+def test_state_is_published_before_any_log_moves(db, monkeypatch):
+    seen = {}
+
+    def sleep(seconds):
+        seen["delay"] = seconds
+        seen["state"] = db.sync[STATE_COLLECTION].find_one({"_id": STATE_ID})
+        seen["hot"] = db.sync.daily_logs.count_documents({})
+
+    async def scenario():
+        await seed()
+        seen["max_report"] = last_old_report(db)
+        monkeypatch.setattr(archive.time, "sleep", sleep)
+        archive_now(db, routing_delay=60)
+
+    asyncio.run(scenario())
+    assert seen["delay"] == 60
+    assert seen["hot"] == len(OLD_DAYS) + len(NEW_DAYS)
+    assert seen["state"]["years"] == sorted({day.year for day in OLD_DAYS})
+    assert seen["state"]["archived_before"] == TODAY - timedelta(days=365)
+    assert seen["state"]["max_report_number"] == seen["max_report"]
+
+
+def test_log_in_both_places_mid_move_is_read_once(db):
+    async def scenario():
+        await seed()
+        archive_now(db)
+        # The window between a batch's copy and its delete
+        archived = await db[archive_collection_name(OLD_DAYS[0].year)].find_one({})
+        await db.daily_logs.insert_one(dict(archived))
+
+        logs = await server.get_daily_logs(current_user=HQ)
+        assert len(logs) == len(OLD_DAYS) + len(NEW_DAYS)
+        assert len({log["id"] for log in logs}) == len(logs)
+
+    asyncio.run(scenario())
+
+
+def test_run_resets_the_epoch_only_when_logs_move(db):
+    async def scenario():
+        await seed(NEW_DAYS)
+        epoch = await database_epoch(db)
+        assert archive_now(db) == 0
+        assert await database_epoch(db) == epoch
+
+        await seed(OLD_DAYS)
+        await server.export_excel(None, None, None, HQ)
+        assert archive_now(db) == len(OLD_DAYS)
+        assert await database_epoch(db) != epoch
+        # An export rendered before (or during) the run is not served after it
+        await server.export_excel(None, None, None, HQ)
+        assert server.export_cache.stats()["hits"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_logs_before_the_horizon_are_read_only(db):
+    async def scenario():
+        await seed()
+        archive_now(db)
+        archived = await db[archive_collection_name(OLD_DAYS[0].year)].find_one({})
+        # Backfilled after the run: still hot, but already behind the horizon
+        await server.create_daily_log(log_for(OLD_DAYS[0], "mintu_export"), HQ)
+        backfilled = await db.daily_logs.find_one({"factory_id": "mintu_export"})
+        recent = await db.daily_logs.find_one({"factory_id": "amen_water"})
+        update = server.DailyLogUpdate(downtime_hours=1.0)
+
+        for log in (archived, backfilled):
+            with pytest.raises(HTTPException) as raised:
+                await server.update_daily_log(log["id"], update, HQ)
+            assert raised.value.status_code == 409
+            with pytest.raises(HTTPException) as raised:
+                await server.delete_daily_log(log["id"], HQ)
+            assert raised.value.status_code == 409
+
+        ids = [archived["id"], backfilled["id"], recent["id"]]
+        result = await server.batch_update_daily_logs(
+            server.DailyLogBatchUpdate(log_ids=ids, changes=update), HQ
+        )
+        assert [outcome["status_code"] for outcome in result["results"]] == [409, 409, 200]
+        result = await server.batch_delete_daily_logs(server.DailyLogSelection(log_ids=ids), HQ)
+        assert [outcome["status_code"] for outcome in result["results"]] == [409, 409, 200]
+        assert await db.daily_logs.count_documents({"id": backfilled["id"]}) == 1
+
+    asyncio.run(scenario())
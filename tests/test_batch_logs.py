@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from archive import archive_catalog, run_archive
+from data_versions import VERSIONS_COLLECTION, month_key
+
+HQ = {"username": "admin", "role": "headquarters"}
+OTHER_HQ = {"username": "planner", "role": "headquarters"}
+TODAY = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+RECENT = [TODAY - timedelta(days=days) for days in (3, 2, 1)]
+OLD = TODAY - timedelta(days=400)
+
+
+def log_for(day: datetime) -> server.DailyLogCreate:
+    return server.DailyLogCreate(
+        date=day.strftime("%Y-%m-%d"),
+        factory_id="amen_water",
+        production_data={"360ml": 40, "600ml": 10},
+        sales_data={
+            "360ml": {"amount": 20, "unit_price": 2.0},
+            "600ml": {"amount": 4, "unit_price": 3.0},
+        },
+        downtime_hours=1.0,
+    )
+
+
+async def seed(db):
+    """Two recent logs by admin, one by another user, and one archived log by admin"""
+    for day in (OLD, RECENT[0], RECENT[1]):
+        await server.create_daily_log(log_for(day), HQ)
+    await server.create_daily_log(log_for(RECENT[2]), OTHER_HQ)
+    run_archive(db.sync, 365, routing_delay=0)
+    archive_catalog.invalidate()
+    logs = await db.daily_logs.find({}).sort("date", 1).to_list(length=None)
+    archived = await db[f"daily_logs_{OLD.year}"].find_one({})
+    return [log["id"] for log in logs], archived["id"]
+
+
+async def months_versions(db) -> dict:
+    versions = await db[VERSIONS_COLLECTION].find_one({"_id": "amen_water"})
+    return dict(versions["months"])
+
+
+def statuses(result: dict) -> dict:
+    return {outcome["id"]: outcome["status_code"] for outcome in result["results"]}
+
+
+def test_batch_update_reports_an_outcome_per_id(db):
+    async def scenario():
+        (mine, also_mine, theirs), archived = await seed(db)
+        versions = await months_versions(db)
+        batch = server.DailyLogBatchUpdate(
+            log_ids=[mine, theirs, "missing", archived, mine],
+            changes=server.DailyLogUpdate(downtime_hours=4.5),
+        )
+        result = await server.batch_update_daily_logs(batch, HQ)
+
+        assert statuses(result) == {mine: 200, theirs: 403, "missing": 404, archived: 409}
+        assert (result["requested"], result["succeeded"], result["failed"]) == (4, 1, 3)
+        assert (await db.daily_logs.find_one({"id": mine}))["downtime_hours"] == 4.5
+        assert (await db.daily_logs.find_one({"id": also_mine}))["downtime_hours"] == 1.0
+        assert (await db.daily_logs.find_one({"id": theirs}))["downtime_hours"] == 1.0
+
+        # Only the month of the changed log moves
+        month = month_key(RECENT[0])
+        assert (await months_versions(db))[month] == versions[month] + 1
+
+    asyncio.run(scenario())
+
+
+def test_unit_price_correction_recomputes_totals(db):
+    async def scenario():
+        (mine, also_mine, theirs), _ = await seed(db)
+        versions = await months_versions(db)
+        batch = server.DailyLogBatchUpdate(log_ids=[mine, also_mine], unit_prices={"600ml": 5.0, "2000ml": 9.0})
+        result = await server.batch_update_daily_logs(batch, HQ)
+
+        assert statuses(result) == {mine: 200, also_mine: 200}
+        for log_id in (mine, also_mine):
+            log = server.expand_line_items(await db.daily_logs.find_one({"id": log_id}))
+            assert log["sales_data"] == {
+                "360ml": {"amount": 20, "unit_price": 2.0},
+                "600ml": {"amount": 4, "unit_price": 5.0},
+            }
+            assert log["total_revenue"] == 20 * 2.0 + 4 * 5.0
+            assert log["total_sales"] == 24
+            assert log["total_production"] == 50
+
+        # Every month touched is bumped once, however many of its logs changed
+        for month in {month_key(RECENT[0]), month_key(RECENT[1])}:
+            assert (await months_versions(db))[month] == versions[month] + 1
+
+    asyncio.run(scenario())
+
+
+def test_unit_prices_for_unsold_products_change_nothing(db):
+    async def scenario():
+        (mine, _, _), _ = await seed(db)
+        versions = await months_versions(db)
+        batch = server.DailyLogBatchUpdate(log_ids=[mine], unit_prices={"2000ml": 9.0})
+        result = await server.batch_update_daily_logs(batch, HQ)
+
+        assert result["results"] == [server.batch_outcome(mine, 200, "No matching products")]
+        assert await months_versions(db) == versions
+
+    asyncio.run(scenario())
+
+
+def test_batch_delete_reports_an_outcome_per_id(db):
+    async def scenario():
+        (mine, also_mine, theirs), archived = await seed(db)
+        versions = await months_versions(db)
+        selection = server.DailyLogSelection(log_ids=[mine, also_mine, theirs, archived, "missing"])
+        result = await server.batch_delete_daily_logs(selection, HQ)
+
+        assert statuses(result) == {mine: 200, also_mine: 200, theirs: 403, archived: 409, "missing": 404}
+        assert [log["id"] for log in await db.daily_logs.find({}).to_list(length=None)] == [theirs]
+        for month in {month_key(RECENT[0]), month_key(RECENT[1])}:
+            assert (await months_versions(db))[month] == versions[month] + 1
+
+    asyncio.run(scenario())
+
+
+def test_batch_size_is_limited_for_ids_and_filters(db, monkeypatch):
+    async def scenario():
+        await seed(db)
+        monkeypatch.setattr(server, "MAX_BATCH_SIZE", 2)
+        changes = server.DailyLogUpdate(downtime_hours=2.0)
+
+        with pytest.raises(HTTPException) as raised:
+            await server.batch_update_daily_logs(server.DailyLogBatchUpdate(log_ids=["a", "b", "c"], changes=changes), HQ)
+        assert raised.value.status_code == 400
+
+        # A filter matching more logs than the limit is refused before anything changes
+        recent = server.DailyLogSelection(start_date=RECENT[0].strftime("%Y-%m-%d"))
+        with pytest.raises(HTTPException) as raised:
+            await server.batch_delete_daily_logs(recent, HQ)
+        assert raised.value.status_code == 400
+        assert await db.daily_logs.count_documents({}) == len(RECENT)
+
+        with pytest.raises(HTTPException) as raised:
+            await server.batch_delete_daily_logs(server.DailyLogSelection(), HQ)
+        assert raised.value.status_code == 400
+
+    asyncio.run(scenario())
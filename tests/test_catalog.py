@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+import server
+from catalog import DEFAULT_FACTORIES, factory_catalog
+
+HQ = {"username": "admin", "role": "headquarters"}
+
+
+def request(etag=None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_catalog_is_seeded_once_with_the_defaults(db):
+    async def scenario():
+        await server.load_catalog()
+        await server.load_catalog()
+        return await factory_catalog.snapshot(db)
+
+    catalog = asyncio.run(scenario())
+    assert catalog.version == 1
+    assert catalog.factories == DEFAULT_FACTORIES
+    assert catalog.units["mintu_plast"] == "Pieces"
+    assert catalog.products["wakene_food"] == DEFAULT_FACTORIES["wakene_food"]["products"]
+
+
+def test_factories_are_revalidated_with_the_etag(db):
+    async def scenario():
+        response = Response()
+        factories = await server.get_factories(request(), response)
+        assert factories == DEFAULT_FACTORIES
+        etag = response.headers["etag"]
+
+        assert (await server.get_factories(request(etag), Response())).status_code == 304
+        await server.put_factory("amen_water", server.FactoryConfig(
+            name="Amen Water", products=["360ml", "600ml", "5000ml"], sku_unit="Paket"
+        ), HQ)
+        changed = Response()
+        factories = await server.get_factories(request(etag), changed)
+        assert factories["amen_water"]["products"][-1] == "5000ml"
+        assert changed.headers["etag"] != etag
+
+    asyncio.run(scenario())
+
+
+def test_catalog_edits_reach_analytics_without_a_restart(db):
+    async def scenario():
+        await server.load_catalog()
+        await server.put_factory("bottling_line", server.FactoryConfig(
+            name="Bottling Line", products=["Crate"], sku_unit="Crate"
+        ), HQ)
+        trends = await server.compute_analytics_trends(7, HQ)
+        comparison = await server.compute_factory_comparison(server.datetime.utcnow().date())
+        return trends, comparison
+
+    trends, comparison = asyncio.run(scenario())
+    assert trends["factories"]["bottling_line"]["production_by_product"].keys() == {"Crate"}
+    assert comparison[-1]["name"] == "Bottling Line"
+    assert comparison[-1]["sku_unit"] == "Crate"
+
+
+@pytest.mark.parametrize("user, products, status_code", [
+    ({"username": "worker", "role": "factory_employer", "factory_id": "amen_water"}, ["A"], 403),
+    (HQ, ["A", "A "], 400),
+    (HQ, ["A", ""], 400),
+])
+def test_invalid_factory_updates_are_rejected(db, user, products, status_code):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.put_factory(
+            "amen_water", server.FactoryConfig(name="Amen", products=products, sku_unit="Paket"), user
+        ))
+    assert error.value.status_code == status_code
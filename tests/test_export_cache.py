@@ -0,0 +1,69 @@
+import os
+
+from export_cache import ExportCache
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = ExportCache(tmp_path, max_bytes=1024)
+    key = cache.make_key(query={"factory_id": "amen_water"}, versions={})
+    assert cache.get(key) is None
+    cache.put(key, b"workbook")
+    assert cache.get(key).read_bytes() == b"workbook"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_file_written_by_another_worker_is_a_hit(tmp_path):
+    writer = ExportCache(tmp_path, max_bytes=1024)
+    reader = ExportCache(tmp_path, max_bytes=1024)
+    writer.put("shared", b"rendered once")
+
+    assert reader.get("shared").read_bytes() == b"rendered once"
+    assert reader.stats()["hits"] == 1
+    assert reader.stats()["entries"] == 1
+
+
+def test_size_limit_covers_the_shared_directory(tmp_path):
+    first = ExportCache(tmp_path, max_bytes=25)
+    second = ExportCache(tmp_path, max_bytes=25)
+    first.put("a", b"x" * 10)
+    os.utime(first.path_for("a"), (1, 1))
+    second.put("b", b"x" * 10)
+    os.utime(second.path_for("b"), (2, 2))
+
+    # Either worker's write evicts the least recently used file, whoever wrote it
+    first.put("c", b"x" * 10)
+    assert sorted(path.stem for path in tmp_path.glob("*.xlsx")) == ["b", "c"]
+    assert first.stats()["size_bytes"] == 20
+
+
+def test_get_refreshes_recency_across_workers(tmp_path):
+    first = ExportCache(tmp_path, max_bytes=25)
+    second = ExportCache(tmp_path, max_bytes=25)
+    first.put("a", b"x" * 10)
+    first.put("b", b"x" * 10)
+    os.utime(first.path_for("a"), (1, 1))
+    os.utime(first.path_for("b"), (2, 2))
+
+    assert second.get("a") is not None
+    first.put("c", b"x" * 10)
+    assert sorted(path.stem for path in tmp_path.glob("*.xlsx")) == ["a", "c"]
+
+
+def test_file_evicted_by_another_worker_is_a_miss(tmp_path):
+    first = ExportCache(tmp_path, max_bytes=1024)
+    second = ExportCache(tmp_path, max_bytes=1024)
+    first.put("gone", b"workbook")
+    second.clear()
+
+    assert first.get("gone") is None
+    assert first.stats()["entries"] == 0
+    assert first.stats()["size_bytes"] == 0
+
+
+def test_existing_files_are_indexed_on_startup(tmp_path):
+    ExportCache(tmp_path, max_bytes=1024).put("kept", b"workbook")
+    restarted = ExportCache(tmp_path, max_bytes=1024)
+    assert restarted.stats()["entries"] == 1
+    assert restarted.get("kept").read_bytes() == b"workbook"
@@ -0,0 +1,221 @@
+import asyncio
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi.responses import FileResponse
+
+import server
+from export_fragments import month_aligned_query
+
+HQ = {"username": "admin", "role": "headquarters"}
+EMPLOYER = {"username": "admin", "role": "factory_employer", "factory_id": "mintu_export"}
+PRODUCTS = {"amen_water": ("360ml", "600ml"), "mintu_export": ("Sesame", "Niger")}
+
+
+def daily_logs():
+    """Two factories reporting every third day from mid-January to mid-April 2025"""
+    logs = []
+    day = datetime(2025, 1, 14)
+    while day <= datetime(2025, 4, 15):
+        for offset, (factory_id, (made, sold)) in enumerate(PRODUCTS.items()):
+            quantity = 100 + day.timetuple().tm_yday + 7 * offset
+            logs.append(server.DailyLogCreate(
+                date=day.strftime("%Y-%m-%d"),
+                factory_id=factory_id,
+                production_data={made: quantity},
+                sales_data={sold: {"amount": quantity // 4, "unit_price": 2.5}},
+                downtime_hours=day.day % 3,
+            ))
+        day += timedelta(days=3)
+    return logs
+
+
+async def seed(logs):
+    for log in logs:
+        await server.create_daily_log(log, HQ)
+
+
+async def export(user=HQ, start_date=None, end_date=None, factory_id=None) -> bytes:
+    response = await server.export_excel(start_date, end_date, factory_id, user)
+    # Cache hits are streamed from disk
+    return Path(response.path).read_bytes() if isinstance(response, FileResponse) else response.body
+
+
+def statistics(content: bytes) -> dict:
+    sheet = pd.read_excel(BytesIO(content), sheet_name="Statistics")
+    return dict(zip(sheet["Metric"], sheet["Value"]))
+
+
+def expected(logs, start: str, end: str, factory_id=None) -> dict:
+    selected = [
+        log for log in logs
+        if start <= log.date <= end and factory_id in (None, log.factory_id)
+    ]
+    return {
+        "reports": len(selected),
+        "production": sum(sum(log.production_data.values()) for log in selected),
+        "revenue": sum(sale["amount"] * sale["unit_price"] for log in selected for sale in log.sales_data.values()),
+        "downtime": sum(log.downtime_hours for log in selected),
+        "dates": sorted({log.date for log in selected}),
+    }
+
+
+def assert_export_matches(content: bytes, want: dict):
+    stats = statistics(content)
+    assert int(stats["Total Reports"]) == want["reports"]
+    assert float(stats["Total Production"]) == want["production"]
+    assert float(stats["Total Revenue"]) == pytest.approx(want["revenue"])
+    assert float(stats["Total Downtime Hours"]) == want["downtime"]
+    assert stats["Date Range Start"] == want["dates"][0]
+    assert stats["Date Range End"] == want["dates"][-1]
+
+    summary = pd.read_excel(BytesIO(content), sheet_name="Summary")
+    assert len(summary) == want["reports"]
+    assert list(summary["Date"]) == sorted(summary["Date"], reverse=True)
+
+
+def test_month_aligned_query_widens_to_whole_months():
+    query = {"factory_id": "amen_water", "date": {"$gte": datetime(2025, 1, 20), "$lte": datetime(2025, 3, 10)}}
+    assert month_aligned_query(query) == {
+        "factory_id": "amen_water",
+        "date": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 4, 1)},
+    }
+    assert month_aligned_query({"factory_id": "amen_water"}) == {"factory_id": "amen_water"}
+
+
+@pytest.mark.parametrize("user, factory_id", [(HQ, None), (HQ, "amen_water"), (EMPLOYER, None)])
+def test_partial_month_ranges_trim_edge_months(db, user, factory_id):
+    logs = daily_logs()
+
+    async def scenario():
+        await seed(logs)
+        # Warm every month's fragment with a full export, then cut ranges out of the cached fragments
+        await export(user, factory_id=factory_id)
+        scope = factory_id or user.get("factory_id")
+        for start, end in [("2025-01-20", "2025-03-10"), ("2025-02-03", "2025-02-17"), ("2025-03-01", "2025-03-31")]:
+            server.export_cache.clear()
+            content = await export(user, start, end, factory_id)
+            assert_export_matches(content, expected(logs, start, end, scope))
+        assert server.fragment_cache.stats()["hits"] > 0
+
+    asyncio.run(scenario())
+
+
+def test_employer_export_is_limited_to_their_factory(db):
+    logs = daily_logs()
+
+    async def scenario():
+        await seed(logs)
+        content = await export(EMPLOYER, factory_id="amen_water")
+        factories = set(pd.read_excel(BytesIO(content), sheet_name="Summary")["Factory"])
+        assert factories == {"Mintu Export"}
+
+    asyncio.run(scenario())
+
+
+def test_edit_in_closed_month_rebuilds_only_that_fragment(db):
+    logs = daily_logs()
+
+    async def scenario():
+        await seed(logs)
+        before = statistics(await export())
+        cached = server.fragment_cache.stats()
+
+        edited = await db.daily_logs.find_one({"factory_id": "amen_water", "date": datetime(2025, 2, 16)})
+        added = 1000
+        await server.update_daily_log(
+            edited["id"],
+            server.DailyLogUpdate(production_data={"360ml": edited["production_data"]["360ml"] + added}),
+            HQ,
+        )
+
+        after = statistics(await export())
+        assert float(after["Total Production"]) == float(before["Total Production"]) + added
+        assert float(after["Amen (Victory) Water - Production"]) == (
+            float(before["Amen (Victory) Water - Production"]) + added
+        )
+        stats = server.fragment_cache.stats()
+        assert stats["misses"] - cached["misses"] == 1
+        assert stats["hits"] - cached["hits"] == cached["fragments"] - 1
+
+    asyncio.run(scenario())
+
+
+def test_deleted_log_drops_out_of_a_cached_range(db):
+    logs = daily_logs()
+
+    async def scenario():
+        await seed(logs)
+        await export(start_date="2025-02-01", end_date="2025-02-28")
+        deleted = await db.daily_logs.find_one({"factory_id": "mintu_export", "date": datetime(2025, 2, 16)})
+        await server.delete_daily_log(deleted["id"], HQ)
+
+        remaining = [log for log in logs if not (log.factory_id == "mintu_export" and log.date == "2025-02-16")]
+        content = await export(start_date="2025-02-01", end_date="2025-02-28")
+        assert_export_matches(content, expected(remaining, "2025-02-01", "2025-02-28"))
+
+    asyncio.run(scenario())
+
+
+def test_repeated_export_is_served_from_the_export_cache(db, monkeypatch):
+    logs = daily_logs()
+
+    async def scenario():
+        await seed(logs)
+        first = await export(start_date="2025-01-20", end_date="2025-03-10")
+
+        async def not_rebuilt(*args, **kwargs):
+            raise AssertionError("export was rebuilt instead of served from the cache")
+        monkeypatch.setattr(server, "build_excel_export", not_rebuilt)
+
+        assert await export(start_date="2025-01-20", end_date="2025-03-10") == first
+        assert server.export_cache.stats()["hits"] == 1
+        response = await server.export_excel("2025-01-20", "2025-03-10", None, HQ)
+        assert isinstance(response, FileResponse)
+        assert response.headers["content-disposition"].startswith("attachment; filename=")
+
+    asyncio.run(scenario())
+
+
+def test_export_cache_key_covers_the_archive_partitions(db):
+    from archive import STATE_COLLECTION, STATE_ID, archive_catalog
+
+    async def scenario():
+        await seed(daily_logs())
+        await export(start_date="2025-01-20", end_date="2025-03-10")
+        # Same data versions, but the range is now also served from an archive partition
+        await db[STATE_COLLECTION].insert_one({"_id": STATE_ID, "years": [2025], "archived_before": datetime(2025, 2, 1)})
+        archive_catalog.invalidate()
+        await export(start_date="2025-01-20", end_date="2025-03-10")
+        assert server.export_cache.stats()["hits"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_month_split_by_the_archive_horizon_counts_both_partitions(db):
+    from archive import archive_catalog, run_archive
+
+    logs = daily_logs()
+
+    async def scenario():
+        await seed(logs)
+        # Cut February 2025 in half: its first half moves to daily_logs_2025, the rest stays hot
+        run_archive(db.sync, (datetime.utcnow().date() - datetime(2025, 2, 15).date()).days, routing_delay=0)
+        archive_catalog.invalidate()
+        assert await db.daily_logs.count_documents({"date": {"$lt": datetime(2025, 2, 15)}}) == 0
+        assert await db.daily_logs_2025.count_documents({"date": {"$gte": datetime(2025, 2, 1)}}) > 0
+
+        catalog = await server.factory_catalog.snapshot(db)
+        aligned = month_aligned_query({"date": {"$gte": datetime(2025, 2, 1), "$lte": datetime(2025, 2, 28)}})
+        signatures = await server.month_signatures(aligned, catalog)
+        for factory_id in PRODUCTS:
+            count = sum(1 for log in logs if log.factory_id == factory_id and log.date.startswith("2025-02"))
+            assert signatures[(factory_id, "2025-02")][-1] == count
+
+        assert_export_matches(await export(start_date="2025-02-01", end_date="2025-02-28"),
+                              expected(logs, "2025-02-01", "2025-02-28"))
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import line_items
+import server
+from line_items import LAYOUT_LINE_ITEMS, LAYOUT_NESTED, NESTED_FIELDS, _migrate
+
+HQ = {"username": "admin", "role": "headquarters"}
+
+
+def new_log(day: int) -> server.DailyLogCreate:
+    return server.DailyLogCreate(
+        date=f"2025-03-{day:02d}",
+        factory_id="amen_water",
+        production_data={"360ml": 10 * day, "600ml": day},
+        sales_data={"360ml": {"amount": day, "unit_price": 2.5}},
+        stock_data={"600ml": 100 + day},
+        downtime_hours=1.5,
+    )
+
+
+async def seed(days):
+    for day in days:
+        await server.create_daily_log(new_log(day), HQ)
+
+
+async def read_logs():
+    logs = await server.find_daily_logs({})
+    return sorted(({k: v for k, v in log.items() if k != "_id"} for log in logs), key=lambda log: log["date"])
+
+
+@pytest.mark.parametrize("stored, configured", [
+    (LAYOUT_LINE_ITEMS, LAYOUT_NESTED),  # migrated before LOG_STORAGE_LAYOUT was switched
+    (LAYOUT_NESTED, LAYOUT_LINE_ITEMS),  # not migrated yet after the switch
+])
+def test_edits_follow_the_stored_layout(db, monkeypatch, stored, configured):
+    async def scenario():
+        await seed([1])
+        _migrate(db.daily_logs.sync, stored)
+        monkeypatch.setattr(line_items, "LOG_STORAGE_LAYOUT", configured)
+
+        log = (await read_logs())[0]
+        await server.update_daily_log(log["id"], server.DailyLogUpdate(production_data={"360ml": 99}), HQ)
+        return await db.daily_logs.find_one({"id": log["id"]}), (await read_logs())[0]
+
+    document, edited = asyncio.run(scenario())
+    assert edited["production_data"] == {"360ml": 99}
+    assert edited["total_production"] == 99
+    assert edited["sales_data"] == {"360ml": {"amount": 1, "unit_price": 2.5}}
+    # The document stays in one layout, with no stale copy of the other
+    if stored == LAYOUT_LINE_ITEMS:
+        assert not set(NESTED_FIELDS.values()) & set(document)
+    else:
+        assert "items" not in document
+
+
+def test_migrate_and_rollback_round_trip(db):
+    async def scenario():
+        await seed(range(1, 6))
+        original = list(db.daily_logs.sync.find({}))
+        before = await read_logs()
+
+        assert _migrate(db.daily_logs.sync, LAYOUT_LINE_ITEMS) == 5
+        migrated = list(db.daily_logs.sync.find({}))
+        assert all("items" in log and not set(NESTED_FIELDS.values()) & set(log) for log in migrated)
+        assert await read_logs() == before
+        assert _migrate(db.daily_logs.sync, LAYOUT_LINE_ITEMS) == 0
+
+        assert _migrate(db.daily_logs.sync, LAYOUT_NESTED) == 5
+        assert await read_logs() == before
+        restored = {log["_id"]: log for log in db.daily_logs.sync.find({})}
+        assert all(restored[log["_id"]] == log for log in original)
+
+    asyncio.run(scenario())
+
+
+def test_item_frame_is_the_same_for_both_layouts(db, monkeypatch):
+    async def scenario():
+        await seed(range(1, 6))
+        query = {"date": {"$gte": datetime(2025, 3, 1), "$lte": datetime(2025, 3, 31)}}
+        nested = await server.load_item_frame(query)
+
+        _migrate(db.daily_logs.sync, LAYOUT_LINE_ITEMS)
+        monkeypatch.setattr(line_items, "LOG_STORAGE_LAYOUT", LAYOUT_LINE_ITEMS)
+        grouped = await server.load_item_frame(query)
+        return nested, grouped
+
+    nested, grouped = asyncio.run(scenario())
+    columns = ["factory_id", "day", "product", "kind", "qty"]
+    assert sorted(map(tuple, nested[columns].to_numpy().tolist())) == sorted(
+        map(tuple, grouped[columns].to_numpy().tolist())
+    )